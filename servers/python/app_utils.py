@@ -1,3 +1,7 @@
+import base64
+import hashlib
+from datetime import datetime
+
 from flask import make_response
 from sqlalchemy.exc import IntegrityError
 
@@ -102,3 +106,81 @@ def create_error_response(message, status_code):
     dict: The error response in the form of a dictionary.
     """
     return make_response({"error": message}, status_code)
+
+
+# Pagination
+
+
+def parse_limit(value, default, maximum):
+    """
+    Parses a page-size query parameter.
+
+    Args:
+    value: The raw parameter value, or None when it was not supplied.
+    default (int): The page size used when no value is supplied.
+    maximum (int): The largest page size a client may request.
+
+    Returns:
+    int: The page size, clamped to 1..maximum.
+
+    Raises:
+    ValueError: If the value is not an integer.
+    """
+    if value is None:
+        return default
+    limit = validate_type(value, "limit", int)
+    return min(max(limit, 1), maximum)
+
+
+def encode_cursor(timestamp, row_id):
+    """
+    Encodes a keyset pagination position as an opaque, URL-safe cursor.
+
+    Args:
+    timestamp (datetime): The sort timestamp of the last row on the page.
+    row_id (int): The primary key of that row, used as a tie-breaker.
+
+    Returns:
+    str: The cursor string.
+    """
+    raw = f"{timestamp.isoformat()}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Decodes a cursor produced by encode_cursor.
+
+    Args:
+    cursor (str): The cursor string.
+
+    Returns:
+    tuple: The (timestamp, row_id) position.
+
+    Raises:
+    ValueError: If the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = base64.urlsafe_b64decode(padded).decode("utf-8").split("|")
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except ValueError:
+        raise ValueError("The cursor is invalid.")
+
+
+# Bump when a response format changes, so ETags handed out before no longer match.
+ETAG_VERSION = 1
+
+
+def make_etag(*parts):
+    """
+    Derives a strong ETag from values that fully determine a response body.
+
+    Args:
+    *parts: Values with a stable repr, such as ids, datetimes and query parameters.
+
+    Returns:
+    str: The unquoted ETag.
+    """
+    raw = repr((ETAG_VERSION,) + parts).encode("utf-8")
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
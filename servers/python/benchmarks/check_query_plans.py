@@ -0,0 +1,124 @@
+"""
+Asserts that the hot chat and session queries are served by their composite indexes.
+
+Runs EXPLAIN against the configured database (an in-memory SQLite database by
+default; point DB_URI at Postgres to check that planner too) and exits non-zero
+if any hot query falls back to a full table scan or sorts its rows instead of
+reading them in index order.
+
+Usage:
+    python benchmarks/check_query_plans.py
+"""
+
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DB_URI", "sqlite://")
+os.environ.setdefault("LLM_PROVIDER", "stub")
+
+from config import create_app, db  # noqa: E402
+from models import ChatMessage, UserSession  # noqa: E402
+from sqlalchemy import or_  # noqa: E402
+from views import (  # noqa: E402
+    backlog_turns_query,
+    latest_turns_query,
+    recent_turns_query,
+)
+
+app = create_app(views=False)
+
+HOT_QUERIES = {
+    "open session lookup (chat, logout)": (
+        db.select(UserSession)
+        .filter_by(user_id=1, ended_at=None)
+        .order_by(UserSession.started_at.desc())
+        .limit(1),
+        "ix_user_sessions_user_id_ended_at_started_at",
+    ),
+    "recent turns (load_conversation_tail)": (
+        recent_turns_query(session_id=1, summary_through_id=10, limit=10),
+        "ix_chat_messages_session_id_id",
+    ),
+    "oldest unfolded turns (load_conversation_tail)": (
+        backlog_turns_query(
+            session_id=1, summary_through_id=10, before_id=500, limit=21
+        ),
+        "ix_chat_messages_session_id_id",
+    ),
+    "latest turns without a session (load_conversation_tail)": (
+        latest_turns_query(user_id=1, limit=10),
+        "ix_chat_messages_user_id_timestamp",
+    ),
+    "last message key (continue_last_conversation)": (
+        db.select(ChatMessage.session_id, ChatMessage.id, ChatMessage.timestamp)
+        .filter_by(user_id=1)
+        .order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc())
+        .limit(1),
+        "ix_chat_messages_user_id_timestamp",
+    ),
+    "session ETag (chat_history)": (
+        db.select(ChatMessage.session_id, ChatMessage.id, ChatMessage.timestamp)
+        .filter_by(session_id=1)
+        .order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc())
+        .limit(1),
+        "ix_chat_messages_session_id_timestamp",
+    ),
+    "session transcript (continue_last_conversation)": (
+        db.select(ChatMessage)
+        .filter_by(session_id=1)
+        .order_by(ChatMessage.timestamp.asc()),
+        "ix_chat_messages_session_id_timestamp",
+    ),
+    "history page (chat_history)": (
+        db.select(ChatMessage)
+        .filter_by(session_id=1)
+        .filter(
+            ChatMessage.timestamp <= datetime(2024, 1, 1),
+            or_(
+                ChatMessage.timestamp < datetime(2024, 1, 1),
+                ChatMessage.id < 100,
+            ),
+        )
+        .order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc())
+        .limit(51),
+        "ix_chat_messages_session_id_timestamp",
+    ),
+}
+
+
+def explain(query):
+    """Returns the planner output for `query` as a single string."""
+    statement = query.compile(
+        dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}
+    )
+    if db.engine.dialect.name == "sqlite":
+        rows = db.session.execute(db.text(f"EXPLAIN QUERY PLAN {statement}"))
+        return "\n".join(row[-1] for row in rows)
+    rows = db.session.execute(db.text(f"EXPLAIN {statement}"))
+    return "\n".join(row[0] for row in rows)
+
+
+def main():
+    failures = 0
+    with app.app_context():
+        db.create_all()
+        if db.engine.dialect.name == "postgresql":
+            # Tiny tables make a sequential scan cheaper than any index; this
+            # asks the planner whether the index is usable at all.
+            db.session.execute(db.text("SET enable_seqscan = off"))
+
+        for label, (query, index_name) in HOT_QUERIES.items():
+            plan = explain(query)
+            ok = index_name in plan and "TEMP B-TREE" not in plan
+            failures += not ok
+            print(f"[{'ok' if ok else 'FAIL'}] {label}: expected {index_name}")
+            if not ok:
+                print("    " + plan.replace("\n", "\n    "))
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
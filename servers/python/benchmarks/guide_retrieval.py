@@ -0,0 +1,89 @@
+"""
+Measures the prompt tokens saved by sending only the relevant support guide sections.
+
+Builds the guide index, then for a set of typical user messages compares the
+system prompt carrying the whole guide with the one carrying the persona and
+the --top-k best sections. Tokens are counted with tiktoken when it is installed
+and with the word/punctuation approximation otherwise. Also reports how long
+building the index and ranking a message take.
+
+Usage:
+    python benchmarks/guide_retrieval.py [--top-k 3] [--guide data/support_guide.txt]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+from context_builder import _encoding, count_tokens  # noqa: E402
+from guide_index import GuideIndex  # noqa: E402
+
+MESSAGES = (
+    "How much of my paycheck should go into savings each month?",
+    "I'm so frustrated, I keep going over my budget no matter what I do.",
+    "I already tried cutting subscriptions and cooking at home, what else?",
+    "I know the basics of index funds; how should I rebalance my portfolio?",
+    "My dashboard stopped updating after I linked my credit card.",
+    "What features does the budgeting tool have for tracking goals?",
+    "How do I update my income in my profile settings?",
+    "My bank account won't connect and the balance is wrong.",
+    "Can you recommend a good pizza place nearby?",
+    "Should I pay off my car loan early or invest the extra money?",
+    "The app keeps showing an error when I sync my accounts.",
+    "Is it worth building an emergency fund before paying off debt?",
+)
+
+
+def measure(repeat, function):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--guide", default=os.path.join(SERVER_DIR, "data", "support_guide.txt")
+    )
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--model", default="gpt-3.5-turbo")
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+
+    with open(args.guide, encoding="utf-8") as file:
+        text = file.read()
+    build_time = measure(max(1, args.repeat // 100), lambda: GuideIndex(text))
+    guide = GuideIndex(text)
+    full_tokens = count_tokens(guide.text, args.model)
+    tokenizer = "tiktoken" if _encoding(args.model) is not None else "approximate"
+
+    print(
+        f"guide: {len(guide.sections)} sections, persona "
+        f"{count_tokens(guide.persona, args.model)} tokens, whole guide "
+        f"{full_tokens} tokens ({tokenizer} count); index built in "
+        f"{build_time * 1000:.2f} ms"
+    )
+    print(f"{'message':<62}{'sections':>9}{'tokens':>8}{'saved':>8}{'rank':>10}")
+    saved = []
+    for message in MESSAGES:
+        sections = guide.rank(message, args.top_k)
+        tokens = count_tokens(guide.prompt(message, args.top_k), args.model)
+        rank_time = measure(args.repeat, lambda: guide.prompt(message, args.top_k))
+        saved.append(1 - tokens / full_tokens)
+        print(
+            f"{message[:60]:<62}{len(sections):>9}{tokens:>8}"
+            f"{saved[-1]:>8.0%}{rank_time * 1e6:>7.1f} us"
+        )
+    print(
+        f"system prompt tokens saved per message: mean {sum(saved) / len(saved):.0%}, "
+        f"min {min(saved):.0%}, max {max(saved):.0%}"
+    )
+
+
+if __name__ == "__main__":
+    main()
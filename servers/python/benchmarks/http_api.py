@@ -0,0 +1,386 @@
+"""
+Benchmarks the HTTP API end to end against a seeded database and the stub LLM.
+
+Bulk-seeds a SQLite database with seed.py (or uses --db-uri as is), starts the
+app in a threaded server subprocess (or targets --url), then drives each
+endpoint in turn for --duration seconds from --concurrency client threads, each
+with its own keep-alive connection and logged in as its own seeded user:
+
+- login: POST /api/login
+- check_session: GET /api/check_session
+- chat_messages: POST /api/chat_messages (completion cache bypassed)
+- continue_last_conversation: GET /api/continue_last_conversation
+
+Throughput and p50/p95/p99 latency are printed per endpoint and, with --output,
+written as JSON together with the run's parameters and git commit. With
+--baseline, the run is compared against an earlier results file and the script
+exits non-zero if any endpoint's p95 grew by more than --max-regression.
+
+Usage:
+    python benchmarks/http_api.py [--concurrency 8] [--duration 10] [--output run.json]
+    python benchmarks/http_api.py --baseline run.json [--max-regression 0.2]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+SEED_PASSWORD = "123456"
+ENDPOINTS = ("login", "check_session", "chat_messages", "continue_last_conversation")
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Client:
+    """One keep-alive connection carrying one user's session cookie."""
+
+    def __init__(self, url, username):
+        parts = urlsplit(url)
+        self.connection = http.client.HTTPConnection(parts.hostname, parts.port)
+        self.username = username
+        self.cookie = None
+
+    def request(self, method, path, body=None):
+        headers = {"Accept": "application/json"}
+        if body is not None:
+            body = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        if self.cookie:
+            headers["Cookie"] = self.cookie
+        self.connection.request(method, path, body, headers)
+        response = self.connection.getresponse()
+        response.read()
+        cookie = response.getheader("Set-Cookie")
+        if cookie and cookie.startswith("session="):
+            self.cookie = cookie.split(";", 1)[0]
+        return response.status
+
+    def login(self, username=None):
+        return self.request(
+            "POST",
+            "/api/login",
+            {"username": username or self.username, "password": SEED_PASSWORD},
+        )
+
+    def close(self):
+        self.connection.close()
+
+
+def endpoint_request(endpoint, client, usernames, count):
+    """Sends the `count`th request of `endpoint` and returns its status."""
+    if endpoint == "login":
+        # Rotate through the seeded users so logins are not all for one row.
+        return client.login(usernames[count % len(usernames)])
+    if endpoint == "check_session":
+        return client.request("GET", "/api/check_session")
+    if endpoint == "chat_messages":
+        return client.request(
+            "POST",
+            "/api/chat_messages",
+            {
+                "message": f"Benchmark question {count} from {client.username}?",
+                "cache": False,
+            },
+        )
+    return client.request("GET", "/api/continue_last_conversation")
+
+
+def drive(endpoint, clients, usernames, args):
+    """Runs `endpoint` from every client for the configured duration."""
+    latencies, statuses = [], Counter()
+    lock = threading.Lock()
+    started = time.perf_counter()
+    measure_from = started + args.warmup
+    stop_at = measure_from + args.duration
+
+    def run(index, client):
+        local_latencies, local_statuses = [], Counter()
+        count = index
+        while True:
+            request_started = time.perf_counter()
+            if request_started >= stop_at:
+                break
+            status = endpoint_request(endpoint, client, usernames, count)
+            finished = time.perf_counter()
+            count += len(clients)
+            if request_started >= measure_from:
+                local_latencies.append(finished - request_started)
+                local_statuses[status] += 1
+        with lock:
+            latencies.extend(local_latencies)
+            statuses.update(local_statuses)
+
+    threads = [
+        threading.Thread(target=run, args=(index, client))
+        for index, client in enumerate(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, statuses, args.duration)
+
+
+def summarize(latencies, statuses, duration):
+    errors = sum(count for status, count in statuses.items() if status >= 400)
+    result = {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "throughput_rps": round(len(latencies) / duration, 1),
+    }
+    if latencies:
+        result.update(
+            mean_ms=round(sum(latencies) / len(latencies) * 1000, 2),
+            p50_ms=round(percentile(latencies, 0.50) * 1000, 2),
+            p95_ms=round(percentile(latencies, 0.95) * 1000, 2),
+            p99_ms=round(percentile(latencies, 0.99) * 1000, 2),
+            max_ms=round(max(latencies) * 1000, 2),
+        )
+    return result
+
+
+def seed(db_uri, args):
+    subprocess.run(
+        [
+            sys.executable,
+            os.path.join(SERVER_DIR, "seed.py"),
+            "--users",
+            str(args.users),
+            "--messages-per-session",
+            str(args.messages_per_session),
+            "--bcrypt-rounds",
+            str(args.bcrypt_rounds),
+            "--reset",
+        ],
+        cwd=SERVER_DIR,
+        env={**os.environ, **server_env(db_uri, args)},
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+def seeded_usernames(db_uri, count):
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(db_uri)
+    with engine.connect() as connection:
+        usernames = connection.execute(
+            text("SELECT username FROM user_auth ORDER BY id LIMIT :count"),
+            {"count": count},
+        ).scalars()
+        usernames = list(usernames)
+    engine.dispose()
+    return usernames
+
+
+def server_env(db_uri, args):
+    return {
+        "DB_URI": db_uri,
+        "LLM_PROVIDER": "stub",
+        "LLM_STUB_LATENCY_MS": str(args.llm_latency_ms),
+        "LLM_STUB_LATENCY_JITTER_MS": "0",
+        "LLM_STUB_CHUNK_INTERVAL_MS": str(args.llm_chunk_interval_ms),
+        "BCRYPT_LOG_ROUNDS": str(args.bcrypt_rounds),
+        # Every benchmark client logs in from 127.0.0.1, repeatedly.
+        "LOGIN_IP_BURST": "1000000000",
+        "LOGIN_IP_PER_MINUTE": "1000000000",
+        "LOGIN_USERNAME_BURST": "1000000000",
+        "LOGIN_USERNAME_PER_MINUTE": "1000000000",
+        "SQL_SERVER_TIMING": "0",
+    }
+
+
+def serve(port):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    from config import create_app
+
+    app = create_app()
+
+    class QuietRequestHandler(WSGIRequestHandler):
+        # Keep-alive, so the numbers are not dominated by connection setup.
+        protocol_version = "HTTP/1.1"
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    make_server(
+        "127.0.0.1", port, app, threaded=True, request_handler=QuietRequestHandler
+    ).serve_forever()
+
+
+def start_server(db_uri, args):
+    port = args.port
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(port)],
+        cwd=SERVER_DIR,
+        env={**os.environ, **server_env(db_uri, args)},
+        stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("Benchmark server exited during startup")
+        try:
+            client = Client(url, None)
+            client.request("GET", "/api/check_session")
+            client.close()
+            return server, url
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("Benchmark server did not start within 60s")
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=SERVER_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(results):
+    print(
+        f"{'endpoint':<28}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}"
+        f"{'p99 ms':>9}{'errors':>8}"
+    )
+    for endpoint, result in results["endpoints"].items():
+        print(
+            f"{endpoint:<28}{result['throughput_rps']:>9.1f}"
+            f"{result.get('p50_ms', 0):>9.1f}{result.get('p95_ms', 0):>9.1f}"
+            f"{result.get('p99_ms', 0):>9.1f}{result['errors']:>8}"
+        )
+
+
+def compare(results, baseline_path, max_regression):
+    """Prints the change against `baseline_path`; returns False on a regression."""
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+    print(f"\nAgainst {baseline_path} (commit {baseline.get('commit')}):")
+    ok = True
+    for endpoint, result in results["endpoints"].items():
+        before = baseline["endpoints"].get(endpoint)
+        if not before or "p95_ms" not in before or "p95_ms" not in result:
+            continue
+        p95_change = result["p95_ms"] / before["p95_ms"] - 1
+        rps_change = result["throughput_rps"] / before["throughput_rps"] - 1
+        regressed = p95_change > max_regression
+        ok = ok and not regressed
+        print(
+            f"{endpoint:<28}p95 {p95_change:+7.1%}  req/s {rps_change:+7.1%}"
+            f"{'  REGRESSION' if regressed else ''}"
+        )
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument(
+        "--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS)
+    )
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--messages-per-session", type=float, default=10)
+    parser.add_argument(
+        "--db-uri", help="Benchmark this database as is instead of seeding one."
+    )
+    parser.add_argument(
+        "--url",
+        help="Benchmark a running server (on --db-uri) instead of starting one.",
+    )
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--llm-latency-ms", type=float, default=50)
+    parser.add_argument(
+        "--llm-chunk-interval-ms",
+        type=float,
+        default=0,
+        help="Simulated generation time per response word, on top of the latency.",
+    )
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline", help="Compare against this results file.")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port)
+        return
+
+    if args.url and not args.db_uri:
+        parser.error("--url needs --db-uri to find the seeded users")
+    db_uri = args.db_uri
+    if not db_uri:
+        db_uri = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+        print(f"Seeding {args.users} users into {db_uri}...")
+        seed(db_uri, args)
+
+    server, url = (None, args.url) if args.url else start_server(db_uri, args)
+    try:
+        usernames = seeded_usernames(db_uri, max(args.users, args.concurrency))
+        clients = [
+            Client(url, usernames[index % len(usernames)])
+            for index in range(args.concurrency)
+        ]
+        for client in clients:
+            if client.login() != 200:
+                raise RuntimeError(f"Could not log in as {client.username}")
+
+        results = {
+            "commit": git_commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "parameters": {
+                name: value
+                for name, value in vars(args).items()
+                if name not in ("output", "baseline", "serve")
+            },
+            "endpoints": {},
+        }
+        for endpoint in args.endpoints:
+            results["endpoints"][endpoint] = drive(endpoint, clients, usernames, args)
+        for client in clients:
+            client.close()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report(results)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.baseline and not compare(results, args.baseline, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Checks startup cost against a budget: import time, app creation time, and which
+heavy modules get loaded.
+
+Runs `python -X importtime` in fresh interpreters, for importing the views module
+and for creating the app (views and all, as a worker does at boot), and keeps
+the fastest of --runs attempts. Exits non-zero if either exceeds its budget, or
+if creating the app imports a module that should only load on first use: the
+OpenAI and Redis clients, tiktoken, Alembic (only for `flask db`) and Faker
+(only for the seeder). The heaviest imports are listed to show what to trim.
+
+Usage:
+    python benchmarks/import_time.py [--import-budget-ms 800] [--create-budget-ms 900]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on first use only, never by creating the app.
+LAZY_MODULES = (
+    "openai",
+    "httpx",
+    "redis",
+    "tiktoken",
+    "alembic",
+    "flask_migrate",
+    "faker",
+)
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import views
+imported = time.perf_counter()
+from config import create_app
+create_app()
+created = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "create_ms": (created - started) * 1000,
+    "modules": sorted(sys.modules),
+}))
+"""
+
+
+def parse_importtime(stderr):
+    """Returns {module: (self_us, cumulative_us)} from `-X importtime` output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            continue
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def probe():
+    env = {
+        **os.environ,
+        "LLM_PROVIDER": os.environ.get("LLM_PROVIDER", "stub"),
+        "DB_URI": os.environ.get("DB_URI", "sqlite://"),
+    }
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=SERVER_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1]), parse_importtime(
+        result.stderr
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--import-budget-ms", type=float, default=800)
+    parser.add_argument("--create-budget-ms", type=float, default=900)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    runs = [probe() for _ in range(args.runs)]
+    timings, imports = min(runs, key=lambda run: run[0]["create_ms"])
+
+    print(f"{'module':<48}{'self ms':>10}{'cumulative ms':>15}")
+    heaviest = sorted(imports.items(), key=lambda item: item[1][0], reverse=True)
+    for name, (self_us, cumulative_us) in heaviest[: args.top]:
+        print(f"{name:<48}{self_us / 1000:>10.1f}{cumulative_us / 1000:>15.1f}")
+    print()
+
+    ok = True
+    for label, value, budget in (
+        ("import views", timings["import_ms"], args.import_budget_ms),
+        ("import views + create_app()", timings["create_ms"], args.create_budget_ms),
+    ):
+        within = value <= budget
+        ok = ok and within
+        print(
+            f"[{'ok' if within else 'FAIL'}] {label}: {value:.0f} ms "
+            f"(budget {budget:.0f} ms)"
+        )
+
+    loaded = [
+        module
+        for module in LAZY_MODULES
+        if any(
+            name == module or name.startswith(module + ".")
+            for name in timings["modules"]
+        )
+    ]
+    ok = ok and not loaded
+    print(
+        f"[{'FAIL' if loaded else 'ok'}] lazy modules loaded at startup: "
+        f"{', '.join(loaded) or 'none'}"
+    )
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Measures legitimate login latency with and without a credential-stuffing attack.
+
+Legitimate users log in, each from their own address: first on an idle server,
+then while attacker threads flood /api/login with guessed credentials from a
+handful of addresses, once with the login throttle effectively disabled and once
+with it enabled. Throttled attack requests are answered with 429 before any
+bcrypt work runs, so with the throttle on the legitimate p50/p95 should stay
+close to the idle numbers.
+
+The allowed attack rate (addresses x --ip-per-minute) must stay well below the
+box's bcrypt throughput for latency to stay flat; the script prints both.
+
+Before timing anything, checks that a bucket table saturated with refilling
+buckets still throttles new keys, and exits non-zero if it does not.
+
+Usage:
+    python benchmarks/login_throttle.py [--attack-rate 50] [--logins 10] [--rounds 12]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ATTACKER_ADDRESSES = 4
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def legit_logins(app, count):
+    client = app.test_client()
+    latencies = []
+    for i in range(count):
+        started = time.perf_counter()
+        response = client.post(
+            "/api/login",
+            json={"username": "legit", "password": "correct-horse"},
+            environ_base={"REMOTE_ADDR": f"10.0.{i // 250}.{i % 250 + 1}"},
+        )
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.get_json()
+    return latencies
+
+
+def attacker(app, index, interval, stop, results):
+    client = app.test_client()
+    attempt = 0
+    next_at = time.perf_counter()
+    while not stop.is_set():
+        # Open loop: attempts go out on schedule however slowly the server answers.
+        next_at += interval
+        time.sleep(max(0.0, next_at - time.perf_counter()))
+        attempt += 1
+        response = client.post(
+            "/api/login",
+            json={"username": f"victim{attempt % 50}", "password": f"guess{attempt}"},
+            environ_base={"REMOTE_ADDR": f"203.0.113.{index % ATTACKER_ADDRESSES}"},
+        )
+        results[response.status_code] += 1
+
+
+def run_attack(app, args):
+    """Measures legitimate logins while attackers run; returns (latencies, results)."""
+    stop = threading.Event()
+    results = Counter()
+    interval = args.attackers / args.attack_rate
+    threads = [
+        threading.Thread(
+            target=attacker, args=(app, i, interval, stop, results), daemon=True
+        )
+        for i in range(args.attackers)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        # Let the attackers drain their burst allowance before measuring.
+        time.sleep(args.warmup)
+        results.clear()
+        started = time.perf_counter()
+        latencies = legit_logins(app, args.logins)
+        elapsed = time.perf_counter() - started
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    return latencies, results, elapsed
+
+
+def report(label, latencies, results=None, elapsed=None):
+    line = (
+        f"{label:<22} p50={statistics.median(latencies) * 1000:7.1f} ms"
+        f"  p95={percentile(latencies, 0.95) * 1000:7.1f} ms"
+    )
+    if results is not None:
+        attempts = sum(results.values())
+        line += (
+            f"  | attack {attempts / elapsed:6.1f} req/s,"
+            f" {results[429]} throttled, {results[401]} reached bcrypt"
+        )
+    print(line)
+
+
+def check_saturated_store(max_keys=1000, burst=5, per_minute=5):
+    """
+    Fills a bucket table with drained buckets, then spends a new key's burst and
+    checks that its next attempt is throttled rather than starting from a full
+    bucket again.
+    """
+    from rate_limiter import MemoryBucketStore
+
+    store = MemoryBucketStore(max_keys=max_keys)
+    rate = per_minute / 60
+    for i in range(max_keys):
+        for _ in range(burst):
+            store.take(f"login:user:spray{i}", burst, rate, 1)
+    for _ in range(burst):
+        store.take("login:user:victim", burst, rate, 1)
+    retry_after = store.take("login:user:victim", burst, rate, 1)
+    ok = retry_after > 0 and len(store) <= max_keys
+    print(
+        f"[{'ok' if ok else 'FAIL'}] saturated table ({len(store)} buckets) "
+        f"throttles a new key: retry after {retry_after:.1f} s"
+    )
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--attackers", type=int, default=8)
+    parser.add_argument("--attack-rate", type=float, default=50.0)
+    parser.add_argument("--logins", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--warmup", type=float, default=10.0)
+    parser.add_argument("--ip-burst", type=int, default=5)
+    parser.add_argument("--ip-per-minute", type=float, default=6)
+    args = parser.parse_args()
+
+    if not check_saturated_store():
+        sys.exit(1)
+
+    database = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ.setdefault("DB_URI", f"sqlite:///{database}")
+    os.environ.setdefault("LLM_PROVIDER", "stub")
+    os.environ["BCRYPT_LOG_ROUNDS"] = str(args.rounds)
+
+    from config import create_app, db, login_throttle, password_hasher
+    from models import UserAuth
+    from rate_limiter import MemoryBucketStore
+
+    app = create_app()
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(
+            UserAuth(
+                username="legit",
+                email="legit@example.com",
+                password_hash=password_hasher.hash("correct-horse"),
+            )
+        )
+        db.session.commit()
+
+    idle = legit_logins(app, args.logins)
+    report("idle", idle)
+    print(f"{'':<22} bcrypt throughput ~{1 / statistics.median(idle):.1f} logins/s")
+
+    throttle_limits = (login_throttle.ip_limit, login_throttle.username_limit)
+    login_throttle.ip_limit = login_throttle.username_limit = (10**9, 10**9)
+    report("attack, no throttle", *run_attack(app, args))
+
+    login_throttle.stores = [MemoryBucketStore()]
+    login_throttle.ip_limit = (args.ip_burst, args.ip_per_minute / 60)
+    login_throttle.username_limit = throttle_limits[1]
+    allowed = ATTACKER_ADDRESSES * args.ip_per_minute / 60
+    print(f"{'':<22} throttle allows attackers {allowed:.2f} req/s")
+    report("attack, throttled", *run_attack(app, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Measures full-text search latency for a user with a large chat history.
+
+Bulk-seeds a SQLite database with seed.py (or uses --db-uri as is): one user
+with --messages messages, then --other-users users with the default history.
+Search terms are sampled from that user's messages at several document
+frequencies, from the most common word down to rare ones, and each query is run
+--repeat times through search_chat_messages. Prints p50/p95 latency and the
+number of matches per query, and exits non-zero if any p95 exceeds --budget-ms.
+
+Usage:
+    python benchmarks/search.py [--messages 100000] [--other-users 1000] [--budget-ms 50]
+    python benchmarks/search.py --db-uri sqlite:////tmp/search.db --user-id 1
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+SESSION_MESSAGES = 1000
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def seed(db_uri, *arguments):
+    subprocess.run(
+        [sys.executable, os.path.join(SERVER_DIR, "seed.py"), *arguments],
+        cwd=SERVER_DIR,
+        env={**os.environ, "DB_URI": db_uri, "LLM_PROVIDER": "stub"},
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+def seed_database(db_uri, args):
+    fixed = ["--session-distribution", "fixed", "--message-distribution", "fixed"]
+    seed(
+        db_uri,
+        "--users",
+        "1",
+        "--sessions-per-user",
+        str(max(1, args.messages // SESSION_MESSAGES)),
+        "--messages-per-session",
+        str(min(args.messages, SESSION_MESSAGES)),
+        *fixed,
+        "--bcrypt-rounds",
+        "4",
+        "--reset",
+    )
+    if args.other_users:
+        seed(db_uri, "--users", str(args.other_users), "--bcrypt-rounds", "4")
+
+
+def sample_queries(connection, user_id, stopwords):
+    """Single and combined terms from the user's messages, common to rare."""
+    from sqlalchemy import text
+
+    texts = connection.execute(
+        text(
+            "SELECT message, response FROM chat_messages WHERE user_id = :user_id "
+            "ORDER BY id LIMIT 2000"
+        ),
+        {"user_id": user_id},
+    ).all()
+    words = Counter(
+        word
+        for row in texts
+        for column in row
+        for word in set(re.findall(r"[^\W_]+", (column or "").lower()))
+        if word not in stopwords and len(word) > 2
+    )
+    ranked = [word for word, _ in words.most_common()]
+    if not ranked:
+        sys.exit("Error: the user has no messages to search.")
+
+    def at(fraction):
+        return ranked[min(len(ranked) - 1, int(fraction * len(ranked)))]
+
+    return [
+        [at(0)],
+        [at(0.05)],
+        [at(0.5)],
+        [ranked[-1]],
+        [at(0), at(0.01)],
+        [at(0.05), at(0.2), at(0.5)],
+        # A question in the user's own words, mostly stopwords.
+        ["what", "did", "it", "say", "about", "my", at(0.1), at(0.3)],
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--other-users", type=int, default=1000)
+    parser.add_argument(
+        "--db-uri", help="Benchmark this database as is instead of seeding one."
+    )
+    parser.add_argument(
+        "--user-id", type=int, default=1, help="The user whose messages to search."
+    )
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--budget-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    db_uri = args.db_uri
+    if not db_uri:
+        db_uri = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'search.db')}"
+        print(f"Seeding {db_uri} ...", flush=True)
+        seed_database(db_uri, args)
+
+    os.environ["DB_URI"] = db_uri
+    os.environ.setdefault("LLM_PROVIDER", "stub")
+    from chat_search import STOPWORDS, search_chat_messages, search_terms
+    from config import create_app, db
+
+    app = create_app(views=False)
+    failed = False
+    with app.app_context():
+        total = db.session.execute(
+            db.text("SELECT COUNT(*) FROM chat_messages WHERE user_id = :user_id"),
+            {"user_id": args.user_id},
+        ).scalar()
+        print(f"user {args.user_id}: {total} messages")
+        print(f"{'query':<60}{'matches':>9}{'p50':>10}{'p95':>10}")
+        for words in sample_queries(db.session, args.user_id, STOPWORDS):
+            terms = search_terms(" ".join(words))
+            latencies = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                search_chat_messages(db.session, args.user_id, terms, args.limit)
+                latencies.append(time.perf_counter() - started)
+            matches = count_matches(db, args.user_id, terms)
+            p95 = percentile(latencies, 0.95) * 1000
+            failed = failed or p95 > args.budget_ms
+            print(
+                f"{' '.join(words)[:58]:<60}{matches:>9}"
+                f"{percentile(latencies, 0.5) * 1000:>8.1f}ms{p95:>8.1f}ms"
+                f"{'  OVER BUDGET' if p95 > args.budget_ms else ''}"
+            )
+    sys.exit(1 if failed else 0)
+
+
+def count_matches(db, user_id, terms):
+    """All of the user's matches, for context; SQLite only."""
+    if db.engine.dialect.name != "sqlite":
+        return "-"
+    from chat_search import sqlite_match
+
+    return db.session.execute(
+        db.text(
+            "SELECT COUNT(*) FROM chat_messages_search "
+            "WHERE chat_messages_search MATCH :query"
+        ),
+        {"query": sqlite_match(user_id, terms)},
+    ).scalar()
+
+
+if __name__ == "__main__":
+    main()
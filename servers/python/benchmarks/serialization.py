@@ -0,0 +1,139 @@
+"""
+Measures the cost of serializing chat messages into a JSON response body.
+
+Compares the former path, a Marshmallow schema dump encoded by Flask's default
+provider with indentation, against the compiled serializers encoded by the
+compact provider, with the standard-library encoder as well as orjson when it
+is installed. Reported per message, for a single chat response and for a
+history page, together with the response size.
+
+Usage:
+    python benchmarks/serialization.py [--messages 50] [--repeat 2000]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DB_URI", "sqlite://")
+os.environ.setdefault("LLM_PROVIDER", "stub")
+
+import json_provider  # noqa: E402
+from config import create_app, ma  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+from models import ChatMessage  # noqa: E402
+from serializers import (  # noqa: E402
+    CHAT_MESSAGE_FIELDS,
+    history_messages,
+    serialize_chat_message,
+)
+
+
+class ChatMessageSchema(ma.SQLAlchemyAutoSchema):
+    """The schema chat responses were dumped with before the compiled serializers."""
+
+    class Meta:
+        model = ChatMessage
+        load_instance = True
+        fields = CHAT_MESSAGE_FIELDS
+
+
+def chat_messages(count):
+    started = datetime(2024, 1, 1)
+    return [
+        ChatMessage(
+            id=index + 1,
+            user_id=1,
+            session_id=1,
+            message=f"How should I split my budget between savings and debt? ({index})",
+            response="Start with an emergency fund, then pay down high-interest debt "
+            "before investing the rest. " * 3,
+            model="gpt-3.5-turbo",
+            prompt_tokens=640,
+            completion_tokens=80,
+            latency_ms=900,
+            timestamp=started + timedelta(seconds=45 * index),
+        )
+        for index in range(count)
+    ]
+
+
+def measure(repeat, build):
+    best = None
+    for _ in range(3):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            body = build()
+        elapsed = (time.perf_counter() - started) / repeat
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    app = create_app(views=False)
+    pretty = DefaultJSONProvider(app)
+    compact = json_provider.FastJSONProvider(app)
+    schema = ChatMessageSchema()
+    schema_many = ChatMessageSchema(many=True)
+    messages = chat_messages(args.messages)
+    message = messages[0]
+
+    encoders = [("stdlib", None)]
+    if json_provider.orjson is not None:
+        encoders.append(("orjson", json_provider.orjson))
+
+    cases = [
+        (
+            "marshmallow + indented stdlib (before)",
+            lambda: pretty.dumps(schema.dump(message), indent=2),
+            lambda: pretty.dumps(schema_many.dump(messages), indent=2),
+            lambda: pretty.dumps({"messages": history_messages(messages)}, indent=2),
+        )
+    ]
+    for label, encoder in encoders:
+
+        def dumps(obj, encoder=encoder):
+            saved = json_provider.orjson
+            json_provider.orjson = encoder
+            try:
+                return compact.dumps(obj)
+            finally:
+                json_provider.orjson = saved
+
+        cases.append(
+            (
+                f"compiled + compact {label}",
+                lambda dumps=dumps: dumps(serialize_chat_message(message)),
+                lambda dumps=dumps: dumps(
+                    [serialize_chat_message(msg) for msg in messages]
+                ),
+                lambda dumps=dumps: dumps({"messages": history_messages(messages)}),
+            )
+        )
+
+    print(
+        f"{'path':<40}{'1 message':>14}{f'{args.messages} messages':>18}"
+        f"{'history page':>18}"
+    )
+    for label, single, many, history in cases:
+        single_time, single_size = measure(args.repeat, single)
+        many_time, many_size = measure(args.repeat // 10 or 1, many)
+        history_time, history_size = measure(args.repeat // 10 or 1, history)
+        print(
+            f"{label:<40}"
+            f"{single_time * 1e6:>7.1f} us {single_size:>4} B"
+            f"{many_time / args.messages * 1e6:>7.1f} us/msg {many_size:>5} B"
+            f"{history_time / args.messages * 1e6:>7.1f} us/msg {history_size:>5} B"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Compares the per-request cost of each session backend.
+
+For every backend a session holding a logged-in user is created once, then the
+script times the session work Flask does around each request (open_session on
+the way in, save_session on the way out) for read-only requests, which is every
+API call except login/logout, and for requests that modify the session.
+
+The old filesystem Flask-Session backend is included when flask_session is
+installed, and Redis when --redis-url is given.
+
+Usage:
+    python benchmarks/session_store.py [--requests 5000] [--redis-url redis://...]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, request  # noqa: E402
+from flask.sessions import SecureCookieSessionInterface  # noqa: E402
+from session_store import (  # noqa: E402
+    CachedSessionStore,
+    RedisSessionStore,
+    SQLiteSessionStore,
+    StoreSessionInterface,
+)
+
+SESSION_DATA = {"user_id": 42, "username": "alice", "logged_in": True, "session_id": 7}
+
+
+def make_app():
+    app = Flask(__name__)
+    app.secret_key = "benchmark"
+    return app
+
+
+def backends(workdir, redis_url):
+    """Yields (label, app, session interface) for every available backend."""
+    app = make_app()
+    yield "cookie (signed)", app, SecureCookieSessionInterface()
+    yield "sqlite", app, StoreSessionInterface(
+        SQLiteSessionStore(os.path.join(workdir, "plain.db"))
+    )
+    yield "sqlite + read cache", app, StoreSessionInterface(
+        CachedSessionStore(SQLiteSessionStore(os.path.join(workdir, "cached.db")))
+    )
+    if redis_url:
+        yield "redis", app, StoreSessionInterface(RedisSessionStore(redis_url))
+        yield "redis + read cache", app, StoreSessionInterface(
+            CachedSessionStore(RedisSessionStore(redis_url))
+        )
+    try:
+        from flask_session import Session
+    except ImportError:
+        return
+    filesystem_app = make_app()
+    filesystem_app.config.update(
+        SESSION_TYPE="filesystem",
+        SESSION_FILE_DIR=os.path.join(workdir, "flask_session"),
+        SESSION_USE_SIGNER=True,
+    )
+    Session(filesystem_app)
+    yield "filesystem (flask_session)", filesystem_app, filesystem_app.session_interface
+
+
+def session_cookie(app, interface):
+    """Performs a login-like request and returns the resulting cookie header."""
+    with app.test_request_context():
+        session = interface.open_session(app, request)
+        session.update(SESSION_DATA)
+        response = app.response_class()
+        interface.save_session(app, session, response)
+    cookie = response.headers["Set-Cookie"].split(";", 1)[0]
+    return cookie
+
+
+def time_requests(app, interface, cookie, count, modify):
+    """Returns the mean session overhead per request, in seconds."""
+    elapsed = 0.0
+    for i in range(count):
+        with app.test_request_context(headers={"Cookie": cookie}):
+            response = app.response_class()
+            started = time.perf_counter()
+            session = interface.open_session(app, request)
+            assert session.get("user_id") == 42
+            if modify:
+                session["last_seen"] = i
+            interface.save_session(app, session, response)
+            elapsed += time.perf_counter() - started
+    return elapsed / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--redis-url")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        print(f"{'backend':<28}{'read (us/req)':>15}{'write (us/req)':>16}")
+        for label, app, interface in backends(workdir, args.redis_url):
+            cookie = session_cookie(app, interface)
+            read = time_requests(app, interface, cookie, args.requests, False)
+            write = time_requests(app, interface, cookie, args.requests, True)
+            print(f"{label:<28}{read * 1e6:>15.1f}{write * 1e6:>16.1f}")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
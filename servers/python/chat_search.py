@@ -0,0 +1,259 @@
+# Full-text search over chat messages: FTS5 on SQLite, tsvector and GIN on Postgres.
+
+import html
+import re
+from collections import namedtuple
+
+from sqlalchemy import DDL, DateTime, Integer, Text, event, text
+
+# SQLite: an external-content FTS5 index over chat_messages, kept in sync by
+# triggers so every insert path (ORM, write-behind batches, the seeder) updates
+# it. The owner column indexes a "u<user_id>" token; matching on it lets FTS5
+# intersect the query with one user's postings instead of ranking every user's
+# matches and filtering afterwards. The view only exists to give snippet() and
+# 'rebuild' the same columns the index was built from.
+SQLITE_DDL = (
+    """
+    CREATE VIEW chat_messages_search_content AS
+    SELECT id, message, response, 'u' || user_id AS owner FROM chat_messages
+    """,
+    """
+    CREATE VIRTUAL TABLE chat_messages_search USING fts5(
+        message, response, owner,
+        content='chat_messages_search_content', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER chat_messages_search_insert AFTER INSERT ON chat_messages BEGIN
+        INSERT INTO chat_messages_search (rowid, message, response, owner)
+        VALUES (new.id, new.message, new.response, 'u' || new.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER chat_messages_search_delete AFTER DELETE ON chat_messages BEGIN
+        INSERT INTO chat_messages_search
+            (chat_messages_search, rowid, message, response, owner)
+        VALUES ('delete', old.id, old.message, old.response, 'u' || old.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER chat_messages_search_update AFTER UPDATE ON chat_messages BEGIN
+        INSERT INTO chat_messages_search
+            (chat_messages_search, rowid, message, response, owner)
+        VALUES ('delete', old.id, old.message, old.response, 'u' || old.user_id);
+        INSERT INTO chat_messages_search (rowid, message, response, owner)
+        VALUES (new.id, new.message, new.response, 'u' || new.user_id);
+    END
+    """,
+)
+SQLITE_DROP = (
+    "DROP TABLE IF EXISTS chat_messages_search",
+    "DROP VIEW IF EXISTS chat_messages_search_content",
+)
+# Postgres: a generated column, so the database keeps it in sync on insert, and
+# a GIN index. The user_id filter is combined with it through a bitmap AND.
+POSTGRESQL_DDL = (
+    """
+    ALTER TABLE chat_messages ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        to_tsvector('english', message || ' ' || coalesce(response, ''))
+    ) STORED
+    """,
+    "CREATE INDEX ix_chat_messages_search_vector ON chat_messages "
+    "USING gin (search_vector)",
+)
+
+# Snippets are delimited with private-use characters so the text around them
+# can be HTML-escaped before the markers become <mark> tags.
+HIGHLIGHT_START = "\ue000"
+HIGHLIGHT_END = "\ue001"
+SNIPPET_TOKENS = 12
+MAX_SEARCH_TERMS = 8
+# Ranking costs a few microseconds per match, so a word in most of a large
+# history would otherwise take well over 100 ms. Only the newest matches are
+# ranked; finding them is a cheap scan of the index in rowid order.
+MAX_RANKED_MATCHES = 2000
+
+SearchResult = namedtuple(
+    "SearchResult", ["id", "session_id", "timestamp", "message", "response"]
+)
+RESULT_TYPES = {
+    "id": Integer,
+    "session_id": Integer,
+    "timestamp": DateTime,
+    "message": Text,
+    "response": Text,
+}
+
+STOPWORDS = frozenset("""
+    a about above after again all am an and any are as at be because been before
+    being below between both but by can could did do does doing down during each
+    few for from further had has have having he her here hers him his how i if in
+    into is it its just me more most my no nor not now of off on once only or
+    other our out over own said same say says she should so some such than that
+    the their them then there these they this those through to too under until up
+    very was we were what when where which while who whom why will with would you
+    your
+    """.split())
+
+SQLITE_SEARCH = text(f"""
+    SELECT chat_messages.id, chat_messages.session_id, chat_messages.timestamp,
+        snippet(chat_messages_search, 0, :start, :end, '…', {SNIPPET_TOKENS})
+            AS message,
+        snippet(chat_messages_search, 1, :start, :end, '…', {SNIPPET_TOKENS})
+            AS response
+    FROM chat_messages_search
+    CROSS JOIN chat_messages ON chat_messages.id = chat_messages_search.rowid
+    WHERE chat_messages_search MATCH :query
+        AND chat_messages_search.rowid >= coalesce((
+            SELECT rowid FROM chat_messages_search
+            WHERE chat_messages_search MATCH :query
+            ORDER BY rowid DESC LIMIT 1 OFFSET :candidates - 1
+        ), 0)
+    ORDER BY bm25(chat_messages_search, 1.0, 1.0, 0.0), chat_messages.id DESC
+    LIMIT :limit OFFSET :offset
+    """).columns(**RESULT_TYPES)
+# Headlines are expensive, so they are only built for the page of ranked rows.
+POSTGRESQL_SEARCH = text(f"""
+    WITH query AS (SELECT to_tsquery('english', :query) AS query),
+    candidates AS (
+        SELECT id, session_id, timestamp, message, response, search_vector
+        FROM chat_messages, query
+        WHERE user_id = :user_id AND search_vector @@ query.query
+        ORDER BY id DESC
+        LIMIT :candidates
+    ),
+    page AS (
+        SELECT id, session_id, timestamp, message, response,
+            ts_rank(search_vector, query.query) AS rank
+        FROM candidates, query
+        ORDER BY rank DESC, id DESC
+        LIMIT :limit OFFSET :offset
+    )
+    SELECT page.id, page.session_id, page.timestamp,
+        ts_headline('english', page.message, query.query, :options) AS message,
+        ts_headline('english', coalesce(page.response, ''), query.query, :options)
+            AS response
+    FROM page, query
+    ORDER BY page.rank DESC, page.id DESC
+    """).columns(**RESULT_TYPES)
+HEADLINE_OPTIONS = (
+    f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, "
+    f"MaxWords={SNIPPET_TOKENS}, MinWords={SNIPPET_TOKENS // 2}, "
+    "MaxFragments=1, FragmentDelimiter=…"
+)
+
+
+def install_search_index(table):
+    """
+    Creates the search index together with `table` (chat_messages) in
+    `create_all`, and drops it first in `drop_all`, on SQLite and Postgres.
+    """
+    for statement in SQLITE_DDL:
+        event.listen(table, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+    for statement in POSTGRESQL_DDL:
+        event.listen(
+            table, "after_create", DDL(statement).execute_if(dialect="postgresql")
+        )
+    for statement in SQLITE_DROP:
+        event.listen(table, "before_drop", DDL(statement).execute_if(dialect="sqlite"))
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """
+    Keeps Alembic autogenerate from dropping the search index, which lives
+    outside the models' metadata.
+    """
+    if type_ == "table" and name.startswith("chat_messages_search"):
+        return False
+    if type_ == "column" and name == "search_vector":
+        return False
+    if type_ == "index" and name == "ix_chat_messages_search_vector":
+        return False
+    return True
+
+
+def search_terms(query):
+    """
+    Splits free text into lowercase search terms, without stopwords and
+    duplicates, keeping at most MAX_SEARCH_TERMS.
+    """
+    terms = []
+    for term in re.findall(r"[^\W_]+", query.lower()):
+        if term not in STOPWORDS and term not in terms:
+            terms.append(term)
+    return terms[:MAX_SEARCH_TERMS]
+
+
+def sqlite_match(user_id, terms):
+    """The FTS5 query for messages of `user_id` containing any of `terms`."""
+    quoted = " OR ".join(f'"{term}"' for term in terms)
+    return f'owner:"u{user_id}" AND ({quoted})'
+
+
+def highlight(snippet):
+    """HTML-escapes a snippet and wraps its matched terms in <mark> tags."""
+    return (
+        html.escape(snippet or "")
+        .replace(HIGHLIGHT_START, "<mark>")
+        .replace(HIGHLIGHT_END, "</mark>")
+    )
+
+
+def search_chat_messages(connection, user_id, terms, limit, offset=0):
+    """
+    Returns one page of a user's chat messages matching any of `terms`, best
+    match first, with highlighted snippets of the message and response.
+
+    Messages matching more of the terms, or matching them more often, rank
+    higher (BM25 on SQLite, ts_rank on Postgres). Only the newest
+    MAX_RANKED_MATCHES matches are ranked, so queries for very common words stay
+    fast and favor recent advice. Messages still waiting in the write-behind
+    queue are found once they are flushed.
+
+    Args:
+    connection: A SQLAlchemy Connection or Session.
+    user_id (int): The user whose messages are searched.
+    terms (list): Search terms from search_terms; must not be empty.
+    limit (int): Maximum number of results.
+    offset (int): Number of higher-ranked results to skip.
+
+    Returns:
+    tuple: SearchResults with highlighted snippets of the message and response,
+    and the offset of the next page, or None.
+    """
+    bind = connection.get_bind() if hasattr(connection, "get_bind") else connection
+    params = {
+        "user_id": user_id,
+        "limit": limit + 1,
+        "offset": offset,
+        "candidates": MAX_RANKED_MATCHES,
+    }
+    if bind.dialect.name == "postgresql":
+        statement = POSTGRESQL_SEARCH
+        params.update(query=" | ".join(terms), options=HEADLINE_OPTIONS)
+    else:
+        statement = SQLITE_SEARCH
+        params.update(
+            query=sqlite_match(user_id, terms),
+            start=HIGHLIGHT_START,
+            end=HIGHLIGHT_END,
+        )
+
+    rows = connection.execute(statement, params).all()
+    next_offset = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_offset = offset + limit
+
+    return [
+        SearchResult(
+            row.id,
+            row.session_id,
+            row.timestamp,
+            highlight(row.message),
+            highlight(row.response),
+        )
+        for row in rows
+    ], next_offset
@@ -0,0 +1,155 @@
+# Exact-match cache of LLM completions, keyed on the normalized prompt.
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryCacheBackend:
+    """
+    Size-bounded, per-process LRU store whose entries expire after a TTL.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCacheBackend:
+    """
+    Store shared by every worker through a Redis server; Redis handles TTL and
+    eviction (configure `maxmemory-policy allkeys-lru` on the server).
+    """
+
+    def __init__(self, url, prefix="completion:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError(
+                "COMPLETION_CACHE_URL is set but the 'redis' package is not installed."
+            ) from e
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return value.decode("utf-8") if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=int(ttl))
+
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(self.prefix + "*"))
+
+
+class CompletionCache:
+    """
+    Returns stored completions for prompts that were already answered.
+
+    Keys are a SHA-256 of the model, sampling parameters and every message in the
+    prompt (system prompt, recent context and user message), with whitespace
+    collapsed and case folded so trivially different phrasings share an entry.
+    Backend errors are treated as misses so the cache can never fail a request.
+    """
+
+    def __init__(self, backend, ttl=3600):
+        self.backend = backend
+        self.ttl = ttl
+        # Guards the counters, which request threads update concurrently.
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Builds a cache from COMPLETION_CACHE_URL (shared Redis backend when set),
+        COMPLETION_CACHE_SIZE and COMPLETION_CACHE_TTL.
+        """
+        url = config.get("COMPLETION_CACHE_URL")
+        if url:
+            backend = RedisCacheBackend(url)
+        else:
+            backend = MemoryCacheBackend(max_entries=config["COMPLETION_CACHE_SIZE"])
+        return cls(backend, ttl=config["COMPLETION_CACHE_TTL"])
+
+    @staticmethod
+    def make_key(model, temperature, max_tokens, messages):
+        """
+        Returns the cache key for a prompt.
+
+        Args:
+        model (str): The model the prompt is sent to.
+        temperature (float): Sampling temperature.
+        max_tokens (int): Completion length limit.
+        messages (list): The chat messages, as sent to the provider.
+
+        Returns:
+        str: A hex digest identifying the normalized prompt.
+        """
+        normalized = [
+            [message["role"], " ".join((message["content"] or "").split()).casefold()]
+            for message in messages
+        ]
+        payload = json.dumps(
+            [model, round(float(temperature), 3), max_tokens, normalized],
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            print(f"Completion cache error: {e}")
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        if not value:
+            return
+        try:
+            self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            print(f"Completion cache error: {e}")
+
+    def stats(self):
+        """Returns hit/miss counters and the hit ratio for this worker."""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / total if total else 0.0,
+        }
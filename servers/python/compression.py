@@ -0,0 +1,83 @@
+# Response compression (brotli when installed, else gzip) negotiated per request.
+
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    "application/json",
+    "application/javascript",
+    "text/css",
+    "text/html",
+    "text/plain",
+}
+
+
+def available_encodings():
+    """Content codings this process can produce, most preferred first."""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def encode(data, encoding, level):
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def strip_encoding(etag):
+    """
+    Returns the ETag of the uncompressed representation. Compressed responses
+    carry the identity ETag with a "-<coding>" suffix, since a strong ETag has to
+    differ between representations whose bytes differ.
+    """
+    for encoding in available_encodings():
+        if etag.endswith(f"-{encoding}"):
+            return etag[: -len(encoding) - 1]
+    return etag
+
+
+def init_compression(app):
+    """
+    Compresses responses when COMPRESSION is enabled and the client accepts it.
+
+    Only complete (not streamed) responses with a compressible mimetype and at
+    least COMPRESS_MIN_SIZE bytes are compressed, with gzip at COMPRESS_LEVEL or
+    brotli at COMPRESS_BROTLI_QUALITY. Server-Sent Events and NDJSON exports stay
+    uncompressed so every chunk still reaches the client as soon as it is written.
+    """
+    if not app.config["COMPRESSION"]:
+        return
+    min_size = app.config["COMPRESS_MIN_SIZE"]
+    levels = {
+        "gzip": app.config["COMPRESS_LEVEL"],
+        "br": app.config["COMPRESS_BROTLI_QUALITY"],
+    }
+
+    @app.after_request
+    def compress_response(response):
+        if (
+            response.direct_passthrough
+            or response.is_streamed
+            or response.status_code < 200
+            or response.status_code in (204, 206, 304)
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        ):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        encoding = request.accept_encodings.best_match(available_encodings())
+        if encoding is None or response.content_length < min_size:
+            return response
+
+        response.set_data(encode(response.get_data(), encoding, levels[encoding]))
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(f"{etag}-{encoding}", weak)
+        return response
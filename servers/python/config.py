@@ -1,63 +1,252 @@
 import os
 
+import click
+from completion_cache import CompletionCache
+from compression import init_compression
+from conversation_cache import ConversationCache
 from dotenv import load_dotenv
 from flask import Flask
 from flask_bcrypt import Bcrypt
 from flask_cors import CORS
 from flask_marshmallow import Marshmallow
-from flask_migrate import Migrate
-from flask_restful import Api
 from flask_sqlalchemy import SQLAlchemy
-from openai import OpenAI
+from json_provider import FastJSONProvider
+from lazy_component import LazyComponent
+from llm_gateway import LLMGateway
+from metrics import gauge, init_metrics, instrument_pool
+from password_hasher import PasswordHasher
+from rate_limiter import LoginThrottle
+from session_store import init_session_store
+from sql_profiler import init_sql_profiler
 from sqlalchemy import MetaData
+from werkzeug.middleware.proxy_fix import ProxyFix
 
-from flask_session import Session
-
-# Load environment variables
-load_dotenv()
-
-# Flask app and configuration
-app = Flask(__name__, static_folder="./static", static_url_path="/static")
-
-# API keys and configurations
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise ValueError("The OPENAI_API_KEY environment variable is not set.")
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
-
-# Flask app configurations
-app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "default_secret_key")
-app.config["SESSION_TYPE"] = "filesystem"
-app.config["SESSION_PERMANENT"] = False
-app.config["SESSION_USE_SIGNER"] = True
-app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DB_URI", "sqlite:///app.db")
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.json.compact = False
-
-# Flask extensions
-Session(app)
-CORS(app, resources={r"/api/*": {"origins": "*"}})
+# Flask extensions, bound to the app by create_app
 metadata = MetaData(
     naming_convention={
         "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
     }
 )
 db = SQLAlchemy(metadata=metadata)
-ma = Marshmallow(app)
-migrate = Migrate(app, db)
-bcrypt = Bcrypt(app)
+ma = Marshmallow()
+bcrypt = Bcrypt()
+
+# Components built from the config on first use, so workers, CLI commands and
+# the seeder only pay for the clients, pools and threads they actually use.
+password_hasher = LazyComponent(
+    lambda config: PasswordHasher.from_config(config, bcrypt)
+)
+login_throttle = LazyComponent(LoginThrottle.from_config)
+# LLM gateway: the only path views use to reach the upstream provider
+llm_gateway = LazyComponent(LLMGateway.from_config)
+# Completion cache: answers repeated prompts without an upstream call
+completion_cache = LazyComponent(CompletionCache.from_config)
+conversation_cache = LazyComponent(ConversationCache.from_config)
+
+COMPONENTS = (
+    password_hasher,
+    login_throttle,
+    llm_gateway,
+    completion_cache,
+    conversation_cache,
+)
+
+
+def configure(app):
+    """Reads the app's configuration from the environment (and a .env file)."""
+    load_dotenv()
+
+    # Flask app configurations
+    app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "default_secret_key")
+    # Sessions: "cookie" (stateless, signed), "sqlite" or "redis" (server-side)
+    app.config["SESSION_BACKEND"] = os.getenv("SESSION_BACKEND", "cookie")
+    app.config["SESSION_SQLITE_PATH"] = os.getenv(
+        "SESSION_SQLITE_PATH", os.path.join(app.instance_path, "sessions.db")
+    )
+    app.config["SESSION_REDIS_URL"] = os.getenv("SESSION_REDIS_URL")
+    app.config["SESSION_CACHE_TTL"] = float(os.getenv("SESSION_CACHE_TTL", "5"))
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DB_URI", "sqlite:///app.db")
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+    # Password hashing: bcrypt cost factor and the size of its dedicated worker pool
+    app.config["BCRYPT_LOG_ROUNDS"] = int(os.getenv("BCRYPT_LOG_ROUNDS", "12"))
+    app.config["BCRYPT_WORKERS"] = int(os.getenv("BCRYPT_WORKERS", "2"))
+    app.config["BCRYPT_MAX_QUEUE"] = int(os.getenv("BCRYPT_MAX_QUEUE", "64"))
+
+    # Users allowed to list every account, comma-separated
+    app.config["ADMIN_USERNAMES"] = frozenset(
+        name.strip().lower()
+        for name in os.getenv("ADMIN_USERNAMES", "").split(",")
+        if name.strip()
+    )
+
+    # Reverse proxies in front of the app whose X-Forwarded-For entries are
+    # trusted, so login throttling sees client addresses instead of the proxy's
+    app.config["PROXY_FIX_X_FOR"] = int(os.getenv("PROXY_FIX_X_FOR", "0"))
+
+    # Login throttling: token buckets per client address and per username
+    app.config["LOGIN_LIMITER_URL"] = os.getenv("LOGIN_LIMITER_URL")
+    app.config["LOGIN_LIMITER_MAX_KEYS"] = int(
+        os.getenv("LOGIN_LIMITER_MAX_KEYS", "100000")
+    )
+    app.config["LOGIN_USERNAME_BURST"] = int(os.getenv("LOGIN_USERNAME_BURST", "5"))
+    app.config["LOGIN_USERNAME_PER_MINUTE"] = float(
+        os.getenv("LOGIN_USERNAME_PER_MINUTE", "5")
+    )
+    app.config["LOGIN_IP_BURST"] = int(os.getenv("LOGIN_IP_BURST", "10"))
+    app.config["LOGIN_IP_PER_MINUTE"] = float(os.getenv("LOGIN_IP_PER_MINUTE", "30"))
+
+    # LLM provider: "openai" needs OPENAI_API_KEY, "stub" runs fully offline
+    app.config["LLM_PROVIDER"] = os.getenv("LLM_PROVIDER", "openai")
+    app.config["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
+    app.config["LLM_POOL_SIZE"] = int(os.getenv("LLM_POOL_SIZE", "10"))
+    app.config["LLM_MAX_IN_FLIGHT"] = int(os.getenv("LLM_MAX_IN_FLIGHT", "8"))
+    app.config["LLM_ACQUIRE_TIMEOUT"] = float(os.getenv("LLM_ACQUIRE_TIMEOUT", "2"))
+    app.config["LLM_TIMEOUT"] = float(os.getenv("LLM_TIMEOUT", "30"))
+    app.config["LLM_STUB_LATENCY_MS"] = float(os.getenv("LLM_STUB_LATENCY_MS", "800"))
+    app.config["LLM_STUB_LATENCY_JITTER_MS"] = float(
+        os.getenv("LLM_STUB_LATENCY_JITTER_MS", "200")
+    )
+    app.config["LLM_STUB_LATENCY_DISTRIBUTION"] = os.getenv(
+        "LLM_STUB_LATENCY_DISTRIBUTION", "lognormal"
+    )
+    app.config["LLM_STUB_CHUNK_INTERVAL_MS"] = float(
+        os.getenv("LLM_STUB_CHUNK_INTERVAL_MS", "30")
+    )
+    app.config["LLM_STUB_CHUNK_WORDS"] = int(os.getenv("LLM_STUB_CHUNK_WORDS", "1"))
+    app.config["LLM_STUB_RESPONSE_WORDS"] = int(
+        os.getenv("LLM_STUB_RESPONSE_WORDS", "60")
+    )
+    app.config["LLM_STUB_ERROR_RATE"] = float(os.getenv("LLM_STUB_ERROR_RATE", "0"))
+    app.config["LLM_STUB_TIMEOUT_RATE"] = float(os.getenv("LLM_STUB_TIMEOUT_RATE", "0"))
+    app.config["LLM_STUB_SEED"] = int(os.getenv("LLM_STUB_SEED", "0"))
+    app.config["COMPLETION_CACHE_URL"] = os.getenv("COMPLETION_CACHE_URL")
+    app.config["COMPLETION_CACHE_SIZE"] = int(
+        os.getenv("COMPLETION_CACHE_SIZE", "1024")
+    )
+    app.config["COMPLETION_CACHE_TTL"] = int(os.getenv("COMPLETION_CACHE_TTL", "3600"))
+    app.config["PROMPT_ASSET_CHECK_INTERVAL"] = float(
+        os.getenv("PROMPT_ASSET_CHECK_INTERVAL", "5")
+    )
+    # Support guide sections sent per message; 0 sends the whole guide
+    app.config["GUIDE_TOP_K"] = int(os.getenv("GUIDE_TOP_K", "3"))
+    app.config["CONTEXT_TOKEN_BUDGET"] = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1000"))
+    app.config["CONTEXT_MAX_TURNS"] = int(os.getenv("CONTEXT_MAX_TURNS", "10"))
+    app.config["CONTEXT_SUMMARY_TOKENS"] = int(
+        os.getenv("CONTEXT_SUMMARY_TOKENS", "250")
+    )
+    app.config["CONVERSATION_CACHE_MAX_USERS"] = int(
+        os.getenv("CONVERSATION_CACHE_MAX_USERS", "10000")
+    )
+    app.config["CONVERSATION_CACHE_MAX_BYTES"] = int(
+        os.getenv("CONVERSATION_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+    )
+    app.config["CONVERSATION_CACHE_TTL"] = float(
+        os.getenv("CONVERSATION_CACHE_TTL", "60")
+    )
+    app.config["CHAT_WRITE_BEHIND"] = os.getenv("CHAT_WRITE_BEHIND", "0") == "1"
+    app.config["CHAT_WRITE_BEHIND_BATCH"] = int(
+        os.getenv("CHAT_WRITE_BEHIND_BATCH", "200")
+    )
+    app.config["CHAT_WRITE_BEHIND_INTERVAL"] = float(
+        os.getenv("CHAT_WRITE_BEHIND_INTERVAL", "0.5")
+    )
+    app.config["CHAT_WRITE_BEHIND_MAX_PENDING"] = int(
+        os.getenv("CHAT_WRITE_BEHIND_MAX_PENDING", "2000")
+    )
+    app.config["SQL_PROFILING"] = os.getenv("SQL_PROFILING", "1") == "1"
+    # Unset: follows debug mode, read per request since app.run(debug=True)
+    # only turns it on after the app is configured
+    server_timing = os.getenv("SQL_SERVER_TIMING")
+    app.config["SQL_SERVER_TIMING"] = (
+        server_timing == "1" if server_timing is not None else None
+    )
+    app.config["SLOW_REQUEST_MS"] = float(os.getenv("SLOW_REQUEST_MS", "500"))
+    app.config["SQL_N_PLUS_ONE_THRESHOLD"] = int(
+        os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "5")
+    )
+    # Response compression: gzip, or brotli when installed
+    app.config["COMPRESSION"] = os.getenv("COMPRESSION", "1") == "1"
+    app.config["COMPRESS_MIN_SIZE"] = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+    app.config["COMPRESS_LEVEL"] = int(os.getenv("COMPRESS_LEVEL", "6"))
+    app.config["COMPRESS_BROTLI_QUALITY"] = int(
+        os.getenv("COMPRESS_BROTLI_QUALITY", "5")
+    )
+    app.config["METRICS_DIR"] = os.getenv("METRICS_DIR")
+    app.config["METRICS_FLUSH_INTERVAL"] = float(
+        os.getenv("METRICS_FLUSH_INTERVAL", "5")
+    )
+
+
+def create_app(config=None, views=True):
+    """
+    Creates and configures the Flask app.
+
+    Args:
+    config (dict): Settings overriding the ones read from the environment.
+    views (bool): Registers the API views; scripts that only need the models and
+        database, like the seeder, can skip them.
+    """
+    app = Flask(__name__, static_folder="./static", static_url_path="/static")
+    # Compact JSON responses, encoded with orjson when it is installed
+    app.json = FastJSONProvider(app)
+    configure(app)
+    app.config.update(config or {})
+
+    if app.config["PROXY_FIX_X_FOR"]:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["PROXY_FIX_X_FOR"])
+
+    init_session_store(app)
+    init_sql_profiler(app)
+    init_compression(app)
+    CORS(app, resources={r"/api/*": {"origins": "*"}})
+    db.init_app(app)
+    ma.init_app(app)
+    bcrypt.init_app(app)
+    for component in COMPONENTS:
+        component.init_app(app)
+
+    # Alembic is only needed by the `flask db` commands, so serving workers
+    # skip importing it.
+    if click.get_current_context(silent=True) is not None:
+        from chat_search import include_object
+        from flask_migrate import Migrate
+
+        Migrate(app, db, include_object=include_object)
 
-# Initialize marshmallow
-ma.init_app(app)
+    if views:
+        from views import init_views
 
-# Initialize API
-api = Api(app)
+        init_views(app)
+        # Only the views call the LLM, so scripts need no key
+        if app.config["LLM_PROVIDER"] == "openai" and not app.config["OPENAI_API_KEY"]:
+            app.logger.warning("OPENAI_API_KEY is not set; chat requests will fail.")
 
-# Initialize database
-db.init_app(app)
+    # Metrics: request latency per route, pool waits and in-flight work, on /metrics
+    init_metrics(app, db)
+    gauge("llm_requests_in_flight", "Upstream LLM calls in flight.").set_function(
+        lambda: llm_gateway.in_flight if llm_gateway.created else 0
+    )
+    gauge("bcrypt_queue_depth", "Password operations queued or running.").set_function(
+        lambda: password_hasher.queue_depth if password_hasher.created else 0
+    )
+    return app
 
-# OpenAI client
-app.openai_client = openai_client
 
-if __name__ == "__main__":
-    app.run(port=5555, debug=True)
+def after_fork(app):
+    """
+    Gives a worker forked from a preloaded `app` its own resources. Database
+    connections inherited from the parent are dropped without being closed, as
+    the parent still uses those sockets, and the new pools are timed again. Lazy
+    components are rebuilt on first use, so every worker opens its own LLM and
+    Redis connection pools and bcrypt threads.
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+            instrument_pool(engine)
+    for component in COMPONENTS:
+        component.reset()
+    # A write-behind queue started before the fork has no flush thread here, and
+    # its queued records are the parent's to write.
+    app.extensions.pop("chat_writer", None)
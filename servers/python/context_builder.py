@@ -0,0 +1,130 @@
+# Builds the conversation context sent with each chat message, within a token budget.
+
+import re
+from functools import lru_cache
+
+# Per-message framing the chat format adds on top of the content tokens.
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+@lru_cache(maxsize=8)
+def _encoding(model):
+    """Returns a tiktoken encoding for `model`, or None when tiktoken is unavailable."""
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text, model="gpt-3.5-turbo"):
+    """
+    Counts the tokens in `text` with the model's tokenizer when tiktoken is
+    installed, otherwise with a word/punctuation approximation that slightly
+    overestimates BPE counts for English text.
+    """
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return len(_TOKEN_PATTERN.findall(text))
+
+
+def count_message_tokens(messages, model="gpt-3.5-turbo"):
+    """Counts the tokens a list of chat-format messages costs as a prompt."""
+    return sum(
+        count_tokens(message["content"], model) + MESSAGE_OVERHEAD_TOKENS
+        for message in messages
+    )
+
+
+def pack_turns(chat_messages, budget, max_turns, model="gpt-3.5-turbo"):
+    """
+    Selects the newest turns that fit in `budget` tokens.
+
+    Args:
+    chat_messages (list): ChatMessage rows, newest first.
+    budget (int): Token budget for the packed turns.
+    max_turns (int): Upper bound on the number of turns kept verbatim.
+    model (str): Model whose tokenizer is used for counting.
+
+    Returns:
+    tuple: The kept rows (chronological order) and the rows that did not fit
+    (chronological order), which should be folded into the summary.
+    """
+    kept = []
+    used = 0
+    for chat_message in chat_messages:
+        cost = (
+            count_tokens(chat_message.message, model)
+            + count_tokens(chat_message.response, model)
+            + 2 * MESSAGE_OVERHEAD_TOKENS
+        )
+        if len(kept) >= max_turns or used + cost > budget:
+            break
+        kept.append(chat_message)
+        used += cost
+    dropped = chat_messages[len(kept) :]
+    return list(reversed(kept)), list(reversed(dropped))
+
+
+def _gist(text, max_words):
+    """Returns the first sentence of `text`, cut to `max_words` words."""
+    text = " ".join((text or "").split())
+    sentence = re.split(r"(?<=[.!?])\s", text, maxsplit=1)[0]
+    words = sentence.split()
+    return " ".join(words[:max_words]) + ("..." if len(words) > max_words else "")
+
+
+def fold_summary(summary, chat_messages, budget, model="gpt-3.5-turbo"):
+    """
+    Appends a one-line gist of each turn to `summary`, then drops the oldest lines
+    until the summary fits in `budget` tokens. Runs locally, so updating the
+    summary never costs an extra upstream call.
+
+    Args:
+    summary (str): The current summary, or None.
+    chat_messages (list): Turns leaving the verbatim window, chronological order.
+    budget (int): Token budget for the whole summary.
+    model (str): Model whose tokenizer is used for counting.
+
+    Returns:
+    str: The updated summary.
+    """
+    lines = summary.splitlines() if summary else []
+    for chat_message in chat_messages:
+        lines.append(
+            f"- User: {_gist(chat_message.message, 25)}"
+            f" | Assistant: {_gist(chat_message.response, 25)}"
+        )
+    while lines and count_tokens("\n".join(lines), model) > budget:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+def context_messages(summary, chat_messages):
+    """
+    Returns the chat-format messages for the rolling summary and packed turns,
+    labelling each stored question as a user turn and each answer as an
+    assistant turn.
+    """
+    messages = []
+    if summary:
+        messages.append(
+            {
+                "role": "system",
+                "content": "Summary of the earlier conversation:\n" + summary,
+            }
+        )
+    for chat_message in chat_messages:
+        messages.append({"role": "user", "content": chat_message.message})
+        if chat_message.response:
+            messages.append({"role": "assistant", "content": chat_message.response})
+    return messages
@@ -0,0 +1,167 @@
+# In-process cache of each active user's conversation tail, so the chat hot path can
+# build its prompt without reading the database.
+
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# A turn still waiting in the write-behind queue has no id yet.
+Turn = namedtuple("Turn", "id message response")
+
+# The current session and the turns not yet folded into its summary, oldest first.
+# When a backlog of unfolded turns is only partly loaded, gap_after_id is the id
+# of the last turn before the unloaded ones; turns up to it are contiguous with
+# the summary and the rest are the newest turns of the session.
+ConversationTail = namedtuple(
+    "ConversationTail",
+    "session_id summary summary_through_id turns gap_after_id",
+    defaults=(None,),
+)
+
+# Rough per-entry bookkeeping cost on top of the text itself.
+ENTRY_OVERHEAD_BYTES = 512
+TURN_OVERHEAD_BYTES = 200
+
+
+def tail_size(tail):
+    """Approximates the memory held by `tail`, in bytes."""
+    size = ENTRY_OVERHEAD_BYTES + len(tail.summary or "")
+    for turn in tail.turns:
+        size += TURN_OVERHEAD_BYTES + len(turn.message) + len(turn.response or "")
+    return size
+
+
+class ConversationCache:
+    """
+    LRU of conversation tails keyed by user id.
+
+    Entries are immutable and replaced as a whole under a lock, so concurrent
+    requests for the same user never see a half-updated tail. The cache is
+    bounded both by entry count and by the approximate bytes of text it holds.
+
+    Each worker has its own cache, so a turn or logout handled by another worker
+    is only noticed once the entry expires after `ttl` seconds.
+    """
+
+    def __init__(self, max_users=10000, max_bytes=64 * 1024 * 1024, ttl=60.0):
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            max_users=config["CONVERSATION_CACHE_MAX_USERS"],
+            max_bytes=config["CONVERSATION_CACHE_MAX_BYTES"],
+            ttl=config["CONVERSATION_CACHE_TTL"],
+        )
+
+    def get(self, user_id):
+        """Returns the cached tail for `user_id`, or None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            if entry:
+                self._remove(user_id)
+            self.misses += 1
+            return None
+
+    def put(self, user_id, tail):
+        """Caches `tail` as the user's conversation tail."""
+        with self._lock:
+            self._store(user_id, tail, time.monotonic() + self.ttl)
+
+    def append(self, user_id, session_id, turn):
+        """
+        Adds a committed turn to the user's tail. Ignored when nothing is cached
+        or the cached tail belongs to another session, so a stale tail is never
+        extended.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0].session_id == session_id:
+                tail = entry[0]._replace(turns=entry[0].turns + (turn,))
+                self._store(user_id, tail, entry[1])
+
+    def fold(self, user_id, session_id, summary, summary_through_id):
+        """
+        Records a new summary and drops the turns it now covers. A tail whose
+        loaded backlog is now folded is dropped instead, so the next request
+        loads the following part of the backlog from the database.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0].session_id == session_id:
+                gap_after_id = entry[0].gap_after_id
+                if gap_after_id is not None and summary_through_id >= gap_after_id:
+                    self._remove(user_id)
+                    return
+                tail = entry[0]._replace(
+                    summary=summary,
+                    summary_through_id=summary_through_id,
+                    turns=tuple(
+                        turn
+                        for turn in entry[0].turns
+                        if turn.id is None or turn.id > summary_through_id
+                    ),
+                )
+                self._store(user_id, tail, entry[1])
+
+    def resolve(self, user_id, session_id, turn_id):
+        """
+        Assigns `turn_id` to the oldest turn still waiting for its id. Queued turns
+        are flushed in order, so this is always the turn that was just written.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if not entry or entry[0].session_id != session_id:
+                return
+            turns = list(entry[0].turns)
+            for index, turn in enumerate(turns):
+                if turn.id is None:
+                    turns[index] = turn._replace(id=turn_id)
+                    self._store(
+                        user_id, entry[0]._replace(turns=tuple(turns)), entry[1]
+                    )
+                    return
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._remove(user_id)
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _store(self, user_id, tail, expires_at):
+        self._remove(user_id)
+        size = tail_size(tail)
+        self._entries[user_id] = (tail, expires_at, size)
+        self._bytes += size
+        while self._entries and (
+            len(self._entries) > self.max_users or self._bytes > self.max_bytes
+        ):
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def _remove(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry:
+            self._bytes -= entry[2]
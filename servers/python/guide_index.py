@@ -0,0 +1,133 @@
+# Splits the support guide into sections and ranks them against a user's message
+# with BM25, so each prompt carries only the guidance relevant to it.
+
+import math
+import re
+from collections import Counter, namedtuple
+
+from chat_search import STOPWORDS
+
+_WORD_PATTERN = re.compile(r"[^\W_]+")
+# A heading is a short line of its own ending in a colon, like
+# "When a User Expresses Frustration:".
+_HEADING_PATTERN = re.compile(r"^[^\"“].{0,78}:$")
+
+# Suffixes stripped so "frustrated" matches "frustration" and "updating" matches
+# "update"; crude, but the guide and the messages are stemmed the same way.
+_SUFFIXES = ("ions", "ion", "ing", "ed", "es", "e", "s")
+_MIN_STEM = 3
+
+GuideSection = namedtuple("GuideSection", ["position", "heading", "text"])
+
+
+def stem(word):
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= _MIN_STEM:
+            return word[: -len(suffix)]
+    return word
+
+
+def terms(text):
+    """Lowercase, stemmed words without stopwords."""
+    return [
+        stem(word)
+        for word in _WORD_PATTERN.findall(text.lower())
+        if word not in STOPWORDS
+    ]
+
+
+def split_guide(text):
+    """
+    Splits a guide into its core persona, the text before the first heading, and
+    its sections, each a heading and the lines up to the next one.
+
+    Returns:
+    tuple: The persona text and a list of GuideSections in guide order.
+    """
+    persona, sections = [], []
+    heading, body = None, []
+
+    def close():
+        if heading is not None:
+            sections.append(
+                GuideSection(len(sections), heading, "\n".join(body).strip())
+            )
+
+    for line in text.splitlines():
+        stripped = line.strip()
+        if _HEADING_PATTERN.match(stripped):
+            close()
+            heading, body = stripped, []
+        elif heading is None:
+            persona.append(line)
+        else:
+            body.append(line)
+    close()
+    return "\n".join(persona).strip(), sections
+
+
+class GuideIndex:
+    """
+    A BM25 index over the sections of a support guide, built once per version of
+    the guide file by the prompt asset cache.
+
+    Headings are indexed twice so a section's topic outweighs incidental words
+    in its example reply. Ranking a message costs one dictionary lookup per term
+    and section, with no network calls and no model.
+    """
+
+    def __init__(self, text, k1=1.2, b=0.75):
+        self.text = text
+        self.persona, self.sections = split_guide(text)
+
+        documents = [
+            Counter(terms(f"{section.heading} {section.heading} {section.text}"))
+            for section in self.sections
+        ]
+        lengths = [sum(document.values()) for document in documents]
+        average_length = sum(lengths) / len(lengths) if lengths else 0
+        document_frequency = Counter(
+            term for document in documents for term in document
+        )
+        count = len(documents)
+
+        self.idf = {
+            term: math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequency.items()
+        }
+        # Postings of term -> [(section index, BM25 term frequency weight)], so a
+        # query only visits the sections that contain its terms.
+        self.postings = {}
+        for index, (document, length) in enumerate(zip(documents, lengths)):
+            norm = k1 * (1 - b + b * length / average_length)
+            for term, frequency in document.items():
+                weight = frequency * (k1 + 1) / (frequency + norm)
+                self.postings.setdefault(term, []).append((index, weight))
+
+    def rank(self, query, k):
+        """
+        Returns up to `k` sections relevant to `query`, best first. Sections that
+        share no term with the query are never returned; when none does, the
+        guide's first section, which covers general inquiries, is.
+        """
+        scores = Counter()
+        for term in set(terms(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for index, weight in self.postings[term]:
+                scores[index] += idf * weight
+        if not scores:
+            return self.sections[:1] if k else []
+        return [self.sections[index] for index, _ in scores.most_common(k)]
+
+    def prompt(self, query, k):
+        """
+        Returns the system prompt for `query`: the persona followed by the `k`
+        most relevant sections, kept in the order they appear in the guide.
+        """
+        sections = sorted(self.rank(query, k), key=lambda section: section.position)
+        return "\n\n".join(
+            [self.persona]
+            + [f"{section.heading}\n{section.text}" for section in sections]
+        )
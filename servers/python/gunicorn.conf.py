@@ -0,0 +1,70 @@
+# Production server settings: `gunicorn -c gunicorn.conf.py` (pip install gunicorn).
+# Every setting can be overridden from the environment; see README.md for sizing
+# workers and threads.
+
+import glob
+import os
+
+wsgi_app = "wsgi:app"
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '5555')}")
+
+# One process per core runs Python code; its threads cover the time requests
+# spend waiting on the LLM provider and the database.
+workers = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", "16"))
+
+# Import and build the app once in the master, so workers share its memory
+# copy-on-write instead of each importing everything again.
+preload_app = True
+
+# On reload (SIGHUP) or shutdown (SIGTERM) each old worker stops accepting
+# connections and finishes its in-flight requests, including streamed chat
+# responses bounded by LLM_TIMEOUT, for up to this many seconds.
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "60"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+
+# Recycles each worker after this many requests (plus jitter); 0 never does.
+max_requests = int(os.getenv("MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "0"))
+
+
+def on_starting(server):
+    # Metrics snapshots of a previous deployment would be summed into this one.
+    metrics_dir = os.getenv("METRICS_DIR")
+    if metrics_dir:
+        for path in glob.glob(os.path.join(metrics_dir, "metrics-*.json")):
+            os.remove(path)
+
+
+def post_fork(server, worker):
+    from config import after_fork
+    from wsgi import app
+
+    after_fork(app)
+
+
+def post_worker_init(worker):
+    # Workers reset every signal gunicorn handles, including SIGUSR2, after
+    # post_fork, so the prompt reload handler installed while preloading is
+    # installed again here. The write-behind queue is started in each worker, and
+    # its SIGTERM handler chains to gunicorn's graceful shutdown.
+    import views
+    from prompt_assets import install_reload_signal
+    from write_behind import install_flush_signal
+    from wsgi import app
+
+    install_reload_signal(views.prompt_assets)
+    chat_writer = views.start_chat_writer(app)
+    if chat_writer is not None:
+        install_flush_signal(chat_writer)
+
+
+def worker_exit(server, worker):
+    # Writes out chat messages still waiting in the write-behind queue.
+    from wsgi import app
+
+    chat_writer = app.extensions.get("chat_writer")
+    if chat_writer is not None:
+        chat_writer.stop()
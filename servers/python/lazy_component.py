@@ -0,0 +1,69 @@
+# Stand-in for a component that is built from the app config on first use.
+
+import threading
+
+
+class LazyComponent:
+    """
+    Builds a component with `factory(app.config)` the first time it is used, so
+    creating the app stays cheap and processes that never touch the component
+    (CLI commands, the seeder) never pay for its clients, pools or threads.
+
+    Modules import the LazyComponent itself and use it like the component:
+    attribute reads and writes are forwarded to the instance, which is built once
+    per process under a lock. `init_app` binds it to an app's config. Its own
+    names are limited to `init_app`, `created` and `reset` so they do not shadow
+    the component's.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._config = None
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        with self._lock:
+            self._config = app.config
+            self._instance = None
+
+    @property
+    def created(self):
+        """True once the component has been built, e.g. for metrics that must not build it."""
+        return self._instance is not None
+
+    def reset(self):
+        """
+        Forgets the built component so the next use builds a new one. A forked
+        worker calls this so it never shares its parent's sockets or threads.
+        """
+        with self._lock:
+            self._instance = None
+
+    def _resolve(self):
+        """
+        Returns the component, building it on first use.
+
+        Raises:
+        RuntimeError: If the component is not bound to an app yet.
+        """
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:
+                    if self._config is None:
+                        raise RuntimeError(
+                            "Component used before create_app() configured it."
+                        )
+                    self._instance = self._factory(self._config)
+                instance = self._instance
+        return instance
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._resolve(), name, value)
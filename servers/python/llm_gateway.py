@@ -0,0 +1,217 @@
+# Single entry point for every upstream LLM call made by the API.
+
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+Completion = namedtuple(
+    "Completion",
+    ["text", "model", "prompt_tokens", "completion_tokens", "latency"],
+)
+
+
+class LLMGatewayError(Exception):
+    """Raised when the upstream provider fails to produce a completion."""
+
+
+class LLMGatewayBusy(LLMGatewayError):
+    """Raised when every in-flight slot stays taken for longer than the acquire timeout."""
+
+
+class LLMGatewayTimeout(LLMGatewayError):
+    """Raised when the upstream provider does not answer within the call timeout."""
+
+
+class OpenAIProvider:
+    """
+    Chat completion provider backed by the OpenAI API.
+
+    Owns a single keep-alive HTTP connection pool so repeated calls reuse TLS
+    connections instead of performing a handshake per request.
+    """
+
+    name = "openai"
+
+    def __init__(self, api_key, pool_size=10, keepalive_expiry=60.0, max_retries=1):
+        import httpx
+        from openai import OpenAI
+
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=keepalive_expiry,
+            )
+        )
+        self.client = OpenAI(
+            api_key=api_key, http_client=self.http_client, max_retries=max_retries
+        )
+
+    def complete(self, messages, model, temperature, max_tokens, timeout):
+        import openai
+
+        try:
+            response = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=timeout,
+            )
+        except openai.APITimeoutError as e:
+            raise LLMGatewayTimeout(str(e)) from e
+        except openai.OpenAIError as e:
+            raise LLMGatewayError(str(e)) from e
+
+        text = None
+        if response.choices and response.choices[0].message:
+            text = response.choices[0].message.content
+        usage = response.usage
+        return Completion(
+            text=text.strip() if text else None,
+            model=response.model or model,
+            prompt_tokens=usage.prompt_tokens if usage else None,
+            completion_tokens=usage.completion_tokens if usage else None,
+            latency=None,
+        )
+
+    def stream(self, messages, model, temperature, max_tokens, timeout):
+        import openai
+
+        try:
+            stream = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=timeout,
+                stream=True,
+            )
+            try:
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                stream.close()
+        except openai.APITimeoutError as e:
+            raise LLMGatewayTimeout(str(e)) from e
+        except openai.OpenAIError as e:
+            raise LLMGatewayError(str(e)) from e
+
+    def close(self):
+        self.http_client.close()
+
+
+class LLMGateway:
+    """
+    Provider-agnostic front door for chat completions.
+
+    Caps the number of upstream calls a worker has in flight at once: a caller
+    waits at most `acquire_timeout` seconds for a free slot and then gets
+    LLMGatewayBusy, so request threads cannot pile up behind a slow provider.
+    Every call is bounded by `timeout` seconds unless the caller overrides it.
+    """
+
+    def __init__(self, provider, max_in_flight=8, acquire_timeout=2.0, timeout=30.0):
+        self.provider = provider
+        self.max_in_flight = max_in_flight
+        self.acquire_timeout = acquire_timeout
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Builds a gateway for the provider named by LLM_PROVIDER ("openai" or "stub").
+
+        Raises:
+        ValueError: If the OpenAI provider is selected without an OPENAI_API_KEY,
+            or LLM_PROVIDER names an unknown provider.
+        """
+        provider_name = config["LLM_PROVIDER"]
+        if provider_name == "openai":
+            if not config.get("OPENAI_API_KEY"):
+                raise ValueError("The OPENAI_API_KEY environment variable is not set.")
+            provider = OpenAIProvider(
+                api_key=config["OPENAI_API_KEY"], pool_size=config["LLM_POOL_SIZE"]
+            )
+        elif provider_name == "stub":
+            from llm_stub import StubProvider
+
+            provider = StubProvider.from_config(config)
+        else:
+            raise ValueError(f"Unknown LLM_PROVIDER: {provider_name}")
+
+        return cls(
+            provider,
+            max_in_flight=config["LLM_MAX_IN_FLIGHT"],
+            acquire_timeout=config["LLM_ACQUIRE_TIMEOUT"],
+            timeout=config["LLM_TIMEOUT"],
+        )
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    @contextmanager
+    def _slot(self):
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise LLMGatewayBusy(
+                f"{self.max_in_flight} upstream calls already in flight"
+            )
+        with self._lock:
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    def complete(
+        self,
+        messages,
+        model="gpt-3.5-turbo",
+        temperature=0.7,
+        max_tokens=150,
+        timeout=None,
+    ):
+        """
+        Returns the Completion for `messages`, blocking until the provider answers.
+
+        Raises:
+        LLMGatewayBusy: If no in-flight slot frees up within the acquire timeout.
+        LLMGatewayTimeout: If the provider exceeds the call timeout.
+        LLMGatewayError: For any other provider failure.
+        """
+        with self._slot():
+            started = time.perf_counter()
+            completion = self.provider.complete(
+                messages, model, temperature, max_tokens, timeout or self.timeout
+            )
+            return completion._replace(latency=time.perf_counter() - started)
+
+    def stream(
+        self,
+        messages,
+        model="gpt-3.5-turbo",
+        temperature=0.7,
+        max_tokens=150,
+        timeout=None,
+    ):
+        """
+        Yields the completion for `messages` as text fragments.
+
+        The in-flight slot is held until the stream is exhausted or closed.
+        Raises the same errors as `complete`.
+        """
+        with self._slot():
+            yield from self.provider.stream(
+                messages, model, temperature, max_tokens, timeout or self.timeout
+            )
+
+    def close(self):
+        self.provider.close()
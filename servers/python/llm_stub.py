@@ -0,0 +1,166 @@
+# Local, deterministic stand-in for the upstream LLM, used for load testing and offline work.
+
+import hashlib
+import random
+import threading
+import time
+
+from llm_gateway import Completion, LLMGatewayError, LLMGatewayTimeout
+
+WORDS = (
+    "budget savings goal income expenses emergency fund track spending plan "
+    "monthly review debt interest account balance invest priority habit small "
+    "steps progress automate transfer category limit needs wants future secure"
+).split()
+
+
+class StubProvider:
+    """
+    Chat completion provider that never leaves the process.
+
+    Response text is derived from a hash of the prompt, so the same prompt always
+    gets the same answer. Latency, chunk cadence and injected failures are drawn
+    from a seeded random generator, so a load test replays the same sequence on
+    every run.
+
+    Args:
+    latency_ms (float): Mean time to first token.
+    latency_jitter_ms (float): Spread around the mean (half-width for "uniform",
+        standard deviation for "normal", sigma of the underlying normal for "lognormal").
+    distribution (str): One of "fixed", "uniform", "normal" or "lognormal".
+    chunk_interval_ms (float): Delay between streamed chunks after the first one.
+    chunk_words (int): Number of words per streamed chunk.
+    response_words (int): Length of every response, in words.
+    error_rate (float): Fraction of calls that fail with LLMGatewayError.
+    timeout_rate (float): Fraction of calls that fail with LLMGatewayTimeout.
+    seed (int): Seed for latency and failure sampling.
+    """
+
+    name = "stub"
+
+    def __init__(
+        self,
+        latency_ms=800.0,
+        latency_jitter_ms=200.0,
+        distribution="lognormal",
+        chunk_interval_ms=30.0,
+        chunk_words=1,
+        response_words=60,
+        error_rate=0.0,
+        timeout_rate=0.0,
+        seed=0,
+    ):
+        if distribution not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown stub latency distribution: {distribution}")
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.distribution = distribution
+        self.chunk_interval_ms = chunk_interval_ms
+        self.chunk_words = max(1, chunk_words)
+        self.response_words = response_words
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            latency_ms=config["LLM_STUB_LATENCY_MS"],
+            latency_jitter_ms=config["LLM_STUB_LATENCY_JITTER_MS"],
+            distribution=config["LLM_STUB_LATENCY_DISTRIBUTION"],
+            chunk_interval_ms=config["LLM_STUB_CHUNK_INTERVAL_MS"],
+            chunk_words=config["LLM_STUB_CHUNK_WORDS"],
+            response_words=config["LLM_STUB_RESPONSE_WORDS"],
+            error_rate=config["LLM_STUB_ERROR_RATE"],
+            timeout_rate=config["LLM_STUB_TIMEOUT_RATE"],
+            seed=config["LLM_STUB_SEED"],
+        )
+
+    def complete(self, messages, model, temperature, max_tokens, timeout):
+        latency, failure = self._sample()
+        words = self._response_words(messages, max_tokens)
+        chunks = -(-len(words) // self.chunk_words)
+        delay = latency + (chunks - 1) * self.chunk_interval_ms
+        seconds, failure = self._bounded(delay, failure, timeout)
+        time.sleep(seconds)
+        self._raise_if_failed(failure, timeout)
+        return Completion(
+            text=" ".join(words),
+            model=f"stub-{model}",
+            prompt_tokens=self._count_tokens(messages),
+            completion_tokens=len(words),
+            latency=None,
+        )
+
+    def stream(self, messages, model, temperature, max_tokens, timeout):
+        latency, failure = self._sample()
+        words = self._response_words(messages, max_tokens)
+        seconds, failure = self._bounded(latency, failure, timeout)
+        time.sleep(seconds)
+        self._raise_if_failed(failure, timeout)
+        for start in range(0, len(words), self.chunk_words):
+            if start:
+                time.sleep(self.chunk_interval_ms / 1000)
+            yield ("" if start == 0 else " ") + " ".join(
+                words[start : start + self.chunk_words]
+            )
+
+    def close(self):
+        pass
+
+    def _sample(self):
+        """Draws the time to first token (ms) and the injected failure, if any."""
+        with self._lock:
+            if self.distribution == "fixed":
+                latency = self.latency_ms
+            elif self.distribution == "uniform":
+                latency = self._random.uniform(
+                    self.latency_ms - self.latency_jitter_ms,
+                    self.latency_ms + self.latency_jitter_ms,
+                )
+            elif self.distribution == "normal":
+                latency = self._random.gauss(self.latency_ms, self.latency_jitter_ms)
+            else:
+                # Heavy right tail, like real providers; the median stays at latency_ms.
+                sigma = self.latency_jitter_ms / max(self.latency_ms, 1.0)
+                latency = self.latency_ms * self._random.lognormvariate(0.0, sigma)
+            roll = self._random.random()
+
+        failure = None
+        if roll < self.timeout_rate:
+            failure = "timeout"
+        elif roll < self.timeout_rate + self.error_rate:
+            failure = "error"
+        return max(0.0, latency), failure
+
+    @staticmethod
+    def _bounded(delay_ms, failure, timeout):
+        """
+        Seconds to sleep and the resulting failure. A call whose delay exceeds the
+        call timeout, like an injected timeout, waits out the timeout and fails
+        with a timeout instead of returning late.
+        """
+        delay = delay_ms / 1000
+        if timeout and (failure == "timeout" or delay > timeout):
+            return timeout, "timeout"
+        return delay, failure
+
+    @staticmethod
+    def _raise_if_failed(failure, timeout):
+        if failure == "timeout":
+            raise LLMGatewayTimeout(f"Stub provider timed out after {timeout}s")
+        if failure == "error":
+            raise LLMGatewayError("Stub provider injected failure")
+
+    def _response_words(self, messages, max_tokens):
+        digest = hashlib.sha256(
+            "\n".join(message["content"] or "" for message in messages).encode("utf-8")
+        ).digest()
+        rng = random.Random(digest)
+        count = min(self.response_words, max_tokens or self.response_words)
+        return [rng.choice(WORDS) for _ in range(count)]
+
+    @staticmethod
+    def _count_tokens(messages):
+        return sum(len((message["content"] or "").split()) for message in messages)
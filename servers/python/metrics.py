@@ -0,0 +1,440 @@
+# Built-in metrics registry exported in the Prometheus text format.
+
+import glob
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import request
+from werkzeug.wsgi import ClosingIterator
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values, **labels):
+        if labels:
+            values = tuple(str(labels[name]) for name in self.labelnames)
+        else:
+            values = tuple(str(value) for value in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return _Child(self, values)
+
+    def samples(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def describe(self):
+        return {
+            "type": self.type,
+            "help": self.documentation,
+            "labelnames": list(self.labelnames),
+        }
+
+
+class _Child:
+    """A metric bound to one set of label values."""
+
+    def __init__(self, metric, values):
+        self._metric = metric
+        self._values = values
+
+    def inc(self, amount=1):
+        self._metric._inc(self._values, amount)
+
+    def dec(self, amount=1):
+        self._metric._inc(self._values, -amount)
+
+    def set(self, value):
+        self._metric._set(self._values, value)
+
+    def observe(self, value):
+        self._metric._observe(self._values, value)
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _inc(self, key, amount):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def inc(self, amount=1):
+        self._inc((), amount)
+
+
+class Gauge(_Metric):
+    """
+    A value that goes up and down. A gauge may instead read its value from a
+    function when metrics are collected, e.g. the depth of a queue.
+    """
+
+    type = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def _inc(self, key, amount):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _set(self, key, value):
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1):
+        self._inc((), amount)
+
+    def dec(self, amount=1):
+        self._inc((), -amount)
+
+    def set(self, value):
+        self._set((), value)
+
+    def set_function(self, function):
+        self._function = function
+
+    def samples(self):
+        if self._function is not None:
+            try:
+                self._set((), self._function())
+            except Exception as e:
+                print(f"Metrics error: {e}")
+        return super().samples()
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def _observe(self, key, value):
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {
+                    "buckets": [0] * len(self.buckets),
+                    "sum": 0.0,
+                    "count": 0,
+                }
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["buckets"][index] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def observe(self, value):
+        self._observe((), value)
+
+    def time(self):
+        return _Child(self, ()).time()
+
+    def samples(self):
+        with self._lock:
+            return [
+                [list(key), {**state, "buckets": list(state["buckets"])}]
+                for key, state in self._values.items()
+            ]
+
+    def describe(self):
+        return {**super().describe(), "buckets": list(self.buckets[:-1])}
+
+
+class MetricsRegistry:
+    """
+    Holds the process's metrics and renders them in the Prometheus text format.
+
+    With a `directory`, every worker process writes a snapshot of its metrics
+    there every `flush_interval` seconds (and on each scrape it serves), and a
+    scrape of any worker aggregates all snapshots: counters and histograms are
+    summed over every process that ever wrote one, gauges over live processes
+    only. The directory should be emptied whenever the service is redeployed.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self.directory = None
+        self.flush_interval = 5.0
+        self._thread = None
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def configure(self, directory=None, flush_interval=5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._start()
+
+    def collect(self):
+        return {
+            name: {**metric.describe(), "samples": metric.samples()}
+            for name, metric in self._metrics.items()
+        }
+
+    def write_snapshot(self):
+        if not self.directory:
+            return
+        path = os.path.join(self.directory, f"metrics-{os.getpid()}.json")
+        with open(path + ".tmp", "w") as file:
+            json.dump({"pid": os.getpid(), "metrics": self.collect()}, file)
+        os.replace(path + ".tmp", path)
+
+    def render(self):
+        """Returns every metric, aggregated over worker processes if configured."""
+        if not self.directory:
+            return self._render(self.collect())
+        self.write_snapshot()
+        return self._render(self._aggregate())
+
+    def _aggregate(self):
+        merged = {}
+        for path in glob.glob(os.path.join(self.directory, "metrics-*.json")):
+            try:
+                with open(path) as file:
+                    snapshot = json.load(file)
+            except (OSError, ValueError):
+                continue
+            alive = _process_alive(snapshot["pid"])
+            for name, metric in snapshot["metrics"].items():
+                if metric["type"] == "gauge" and not alive:
+                    continue
+                target = merged.setdefault(name, {**metric, "samples": {}})
+                for labels, value in metric["samples"]:
+                    key = tuple(labels)
+                    if metric["type"] == "histogram":
+                        current = target["samples"].setdefault(
+                            key,
+                            {
+                                "buckets": [0] * len(value["buckets"]),
+                                "sum": 0.0,
+                                "count": 0,
+                            },
+                        )
+                        current["buckets"] = [
+                            a + b for a, b in zip(current["buckets"], value["buckets"])
+                        ]
+                        current["sum"] += value["sum"]
+                        current["count"] += value["count"]
+                    else:
+                        target["samples"][key] = target["samples"].get(key, 0) + value
+        for metric in merged.values():
+            metric["samples"] = [[list(k), v] for k, v in metric["samples"].items()]
+        return merged
+
+    def _render(self, metrics):
+        lines = []
+        for name in sorted(metrics):
+            metric = metrics[name]
+            labelnames = metric["labelnames"]
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            for labels, value in sorted(metric["samples"]):
+                if metric["type"] != "histogram":
+                    lines.append(
+                        f"{name}{_format_labels(labelnames, labels)} {_format_value(value)}"
+                    )
+                    continue
+                cumulative = 0
+                bounds = list(metric["buckets"]) + [math.inf]
+                for bound, count in zip(bounds, value["buckets"]):
+                    cumulative += count
+                    le = (("le", _format_value(bound)),)
+                    lines.append(
+                        f"{name}_bucket{_format_labels(labelnames, labels, le)} {cumulative}"
+                    )
+                lines.append(
+                    f"{name}_sum{_format_labels(labelnames, labels)} {value['sum']}"
+                )
+                lines.append(
+                    f"{name}_count{_format_labels(labelnames, labels)} {value['count']}"
+                )
+        return "\n".join(lines) + "\n"
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="metrics-snapshot", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.write_snapshot()
+            except OSError as e:
+                print(f"Metrics error: {e}")
+
+    def _after_fork(self):
+        # A forked worker starts from zero rather than re-reporting what its
+        # parent recorded before the fork.
+        for metric in self._metrics.values():
+            metric.reset()
+        self._thread = None
+        if self.directory:
+            self._start()
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# The process-wide registry; modules declare their metrics against it at import.
+registry = MetricsRegistry()
+counter = registry.counter
+gauge = registry.gauge
+histogram = registry.histogram
+
+HTTP_REQUEST_SECONDS = histogram(
+    "http_request_duration_seconds",
+    "Time to serve a request, until the response body is fully sent.",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_FLIGHT = gauge(
+    "http_requests_in_flight", "Requests currently being served."
+)
+DB_POOL_WAIT_SECONDS = histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a database connection from the pool.",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5, 30),
+)
+
+
+class MetricsMiddleware:
+    """WSGI middleware timing every request until its body has been sent."""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        started = time.perf_counter()
+        status = ["500"]
+
+        def record_status(status_line, headers, exc_info=None):
+            status[0] = status_line.split(" ", 1)[0]
+            return start_response(status_line, headers, exc_info)
+
+        def finish():
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            HTTP_REQUEST_SECONDS.labels(
+                environ["REQUEST_METHOD"],
+                environ.get("metrics.route", "unmatched"),
+                status[0],
+            ).observe(time.perf_counter() - started)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            iterable = self.wsgi_app(environ, record_status)
+        except Exception:
+            finish()
+            raise
+        return ClosingIterator(iterable, [finish])
+
+
+def instrument_pool(engine):
+    """
+    Times how long each connection checkout from `engine`'s pool waits.
+    Must be applied again if the engine is disposed, which replaces its pool.
+    """
+    pool = engine.pool
+    if getattr(pool, "_metrics_instrumented", False):
+        return
+    connect = pool.connect
+
+    def timed_connect():
+        with DB_POOL_WAIT_SECONDS.time():
+            return connect()
+
+    pool.connect = timed_connect
+    pool._metrics_instrumented = True
+
+
+def init_metrics(app, db):
+    """
+    Records request latency per route and requests in flight for `app`, times
+    pool checkouts on each of `db`'s engines, and configures multi-process
+    aggregation from METRICS_DIR.
+    """
+    registry.configure(app.config["METRICS_DIR"], app.config["METRICS_FLUSH_INTERVAL"])
+    app.wsgi_app = MetricsMiddleware(app.wsgi_app)
+
+    @app.before_request
+    def label_route():
+        request.environ["metrics.route"] = (
+            request.url_rule.rule if request.url_rule else "unmatched"
+        )
+
+    with app.app_context():
+        for engine in db.engines.values():
+            instrument_pool(engine)
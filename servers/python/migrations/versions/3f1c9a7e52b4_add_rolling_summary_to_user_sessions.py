@@ -0,0 +1,28 @@
+"""Add the rolling conversation summary to user sessions.
+
+Revision ID: 3f1c9a7e52b4
+Revises: 6d538b93d3eb
+Create Date: 2026-10-17 14:03:27.561920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a7e52b4'
+down_revision = '6d538b93d3eb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user_sessions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('summary', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('summary_through_id', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('user_sessions', schema=None) as batch_op:
+        batch_op.drop_column('summary_through_id')
+        batch_op.drop_column('summary')
@@ -0,0 +1,65 @@
+"""Add composite indexes for the chat and session hot paths.
+
+Revision ID: 6d538b93d3eb
+Revises: b253fedd6032
+Create Date: 2026-10-17 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6d538b93d3eb'
+down_revision = 'b253fedd6032'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Built CONCURRENTLY on Postgres so large tables stay writable; that has to
+    # run outside a transaction. SQLite ignores the flag.
+    with op.get_context().autocommit_block():
+        # Open session lookup: user_id = ? AND ended_at IS NULL ORDER BY started_at DESC
+        op.create_index(
+            'ix_user_sessions_user_id_ended_at_started_at',
+            'user_sessions',
+            ['user_id', 'ended_at', 'started_at'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        # Recent context: user_id = ? ORDER BY timestamp DESC LIMIT 3
+        op.create_index(
+            'ix_chat_messages_user_id_timestamp',
+            'chat_messages',
+            ['user_id', 'timestamp'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        # Session transcript: session_id = ? ORDER BY timestamp
+        op.create_index(
+            'ix_chat_messages_session_id_timestamp',
+            'chat_messages',
+            ['session_id', 'timestamp'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_chat_messages_session_id_timestamp',
+            table_name='chat_messages',
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_chat_messages_user_id_timestamp',
+            table_name='chat_messages',
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_user_sessions_user_id_ended_at_started_at',
+            table_name='user_sessions',
+            postgresql_concurrently=True,
+        )
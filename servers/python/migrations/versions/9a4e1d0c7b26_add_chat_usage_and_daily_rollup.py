@@ -0,0 +1,52 @@
+"""Store token usage per chat message and add the per-user daily usage rollup.
+
+Revision ID: 9a4e1d0c7b26
+Revises: 3f1c9a7e52b4
+Create Date: 2026-10-17 16:41:09.302716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4e1d0c7b26'
+down_revision = '3f1c9a7e52b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('chat_messages', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('model', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('prompt_tokens', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('completion_tokens', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('latency_ms', sa.Integer(), nullable=True))
+
+    op.create_table('user_daily_usage',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('message_count', sa.Integer(), nullable=False),
+    sa.Column('prompt_tokens', sa.Integer(), nullable=False),
+    sa.Column('completion_tokens', sa.Integer(), nullable=False),
+    sa.Column('latency_ms', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user_auth.id'], name=op.f('fk_user_daily_usage_user_id_user_auth')),
+    sa.PrimaryKeyConstraint('user_id', 'day')
+    )
+
+    # Existing messages have no usage recorded; seed the rollup with their counts.
+    op.execute(
+        'INSERT INTO user_daily_usage '
+        '(user_id, day, message_count, prompt_tokens, completion_tokens, latency_ms) '
+        'SELECT user_id, DATE(timestamp), COUNT(*), 0, 0, 0 '
+        'FROM chat_messages GROUP BY user_id, DATE(timestamp)'
+    )
+
+
+def downgrade():
+    op.drop_table('user_daily_usage')
+    with op.batch_alter_table('chat_messages', schema=None) as batch_op:
+        batch_op.drop_column('latency_ms')
+        batch_op.drop_column('completion_tokens')
+        batch_op.drop_column('prompt_tokens')
+        batch_op.drop_column('model')
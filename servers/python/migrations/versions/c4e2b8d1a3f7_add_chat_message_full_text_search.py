@@ -0,0 +1,87 @@
+"""Add a full-text search index over chat message and response text.
+
+Revision ID: c4e2b8d1a3f7
+Revises: 9a4e1d0c7b26
+Create Date: 2026-10-17 21:05:37.514820
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e2b8d1a3f7'
+down_revision = '9a4e1d0c7b26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # The generated column is filled for existing rows when it is added,
+        # which rewrites the table; the GIN index is then built CONCURRENTLY
+        # so the table stays writable meanwhile.
+        op.execute(
+            "ALTER TABLE chat_messages ADD COLUMN search_vector tsvector "
+            "GENERATED ALWAYS AS ("
+            "to_tsvector('english', message || ' ' || coalesce(response, ''))"
+            ") STORED"
+        )
+        with op.get_context().autocommit_block():
+            op.execute(
+                'CREATE INDEX CONCURRENTLY ix_chat_messages_search_vector '
+                'ON chat_messages USING gin (search_vector)'
+            )
+        return
+
+    # SQLite: an external-content FTS5 table over a view adding the owner token,
+    # kept in sync by triggers, then filled from the existing messages.
+    op.execute(
+        "CREATE VIEW chat_messages_search_content AS "
+        "SELECT id, message, response, 'u' || user_id AS owner FROM chat_messages"
+    )
+    op.execute(
+        "CREATE VIRTUAL TABLE chat_messages_search USING fts5("
+        "message, response, owner, "
+        "content='chat_messages_search_content', content_rowid='id', "
+        "tokenize='porter unicode61 remove_diacritics 2')"
+    )
+    op.execute(
+        "CREATE TRIGGER chat_messages_search_insert AFTER INSERT ON chat_messages BEGIN "
+        "INSERT INTO chat_messages_search (rowid, message, response, owner) "
+        "VALUES (new.id, new.message, new.response, 'u' || new.user_id); "
+        "END"
+    )
+    op.execute(
+        "CREATE TRIGGER chat_messages_search_delete AFTER DELETE ON chat_messages BEGIN "
+        "INSERT INTO chat_messages_search "
+        "(chat_messages_search, rowid, message, response, owner) "
+        "VALUES ('delete', old.id, old.message, old.response, 'u' || old.user_id); "
+        "END"
+    )
+    op.execute(
+        "CREATE TRIGGER chat_messages_search_update AFTER UPDATE ON chat_messages BEGIN "
+        "INSERT INTO chat_messages_search "
+        "(chat_messages_search, rowid, message, response, owner) "
+        "VALUES ('delete', old.id, old.message, old.response, 'u' || old.user_id); "
+        "INSERT INTO chat_messages_search (rowid, message, response, owner) "
+        "VALUES (new.id, new.message, new.response, 'u' || new.user_id); "
+        "END"
+    )
+    op.execute(
+        "INSERT INTO chat_messages_search (chat_messages_search) VALUES ('rebuild')"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute('DROP INDEX CONCURRENTLY ix_chat_messages_search_vector')
+        op.execute('ALTER TABLE chat_messages DROP COLUMN search_vector')
+        return
+
+    op.execute('DROP TRIGGER chat_messages_search_update')
+    op.execute('DROP TRIGGER chat_messages_search_delete')
+    op.execute('DROP TRIGGER chat_messages_search_insert')
+    op.execute('DROP TABLE chat_messages_search')
+    op.execute('DROP VIEW chat_messages_search_content')
@@ -0,0 +1,39 @@
+"""Add a session and id index for loading unsummarised conversation turns.
+
+Revision ID: e5a7f3c9b2d1
+Revises: c4e2b8d1a3f7
+Create Date: 2026-10-17 23:41:08.306517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a7f3c9b2d1'
+down_revision = 'c4e2b8d1a3f7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Built CONCURRENTLY on Postgres so large tables stay writable; that has to
+    # run outside a transaction. SQLite ignores the flag.
+    with op.get_context().autocommit_block():
+        # Conversation tail: session_id = ? AND id > ? ORDER BY id [DESC] LIMIT ?
+        op.create_index(
+            'ix_chat_messages_session_id_id',
+            'chat_messages',
+            ['session_id', 'id'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_chat_messages_session_id_id',
+            table_name='chat_messages',
+            postgresql_concurrently=True,
+        )
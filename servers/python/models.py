@@ -3,12 +3,15 @@
 import re
 from datetime import datetime
 
+from chat_search import install_search_index
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import validates
 from sqlalchemy_serializer import SerializerMixin
 
-from config import bcrypt, db
+from config import db, password_hasher
 
 
 class UserAuth(db.Model, SerializerMixin):
@@ -28,7 +31,8 @@ class UserAuth(db.Model, SerializerMixin):
     - email and username are validated for length and format.
 
     Security:
-    - Passwords are hashed using bcrypt upon setting to ensure secure storage.
+    - Passwords are hashed using bcrypt upon setting to ensure secure storage. Hashing runs on
+      the shared password_hasher pool and may raise PasswordHasherBusy under load.
     - Password field is write-only to prevent unauthorized access.
     """
 
@@ -45,6 +49,9 @@ class UserAuth(db.Model, SerializerMixin):
     sessions = db.relationship(
         "UserSession", back_populates="user", cascade="all, delete-orphan"
     )
+    daily_usage = db.relationship(
+        "UserDailyUsage", back_populates="user", cascade="all, delete-orphan"
+    )
 
     @validates("email")
     def validate_email(self, key, address):
@@ -84,13 +91,13 @@ class UserAuth(db.Model, SerializerMixin):
         """
         Hashes the password before storing it in the database.
         """
-        self.password_hash = bcrypt.generate_password_hash(password).decode("utf-8")
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
         """
         Verifies password against the hash stored in the database
         """
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
 
     serialize_rules = (
         "-password_hash",
@@ -107,17 +114,29 @@ class UserSession(db.Model, SerializerMixin):
     - user_id: Foreign key linking to the UserAuth model. Identifies the user owning the session.
     - started_at: Timestamp when the user logged in and the session was initiated.
     - ended_at: Timestamp when the user logged out, marking the session's end. Nullable, as sessions might be ongoing.
+    - summary: Rolling summary of the session's turns that no longer fit in the prompt's token budget.
+    - summary_through_id: Id of the newest ChatMessage folded into the summary.
 
     Relations:
     - user: Defines the relationship back to the UserAuth model, allowing easy access to the user's data from a session.
     """
 
     __tablename__ = "user_sessions"
+    __table_args__ = (
+        db.Index(
+            "ix_user_sessions_user_id_ended_at_started_at",
+            "user_id",
+            "ended_at",
+            "started_at",
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user_auth.id"), nullable=False)
     started_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     ended_at = db.Column(db.DateTime, nullable=True)
+    summary = db.Column(db.Text, nullable=True)
+    summary_through_id = db.Column(db.Integer, nullable=True)
 
     user = db.relationship("UserAuth", back_populates="sessions")
 
@@ -135,9 +154,18 @@ class ChatMessage(db.Model, SerializerMixin):
     - message: The content of the user's message.
     - response: The system's response to the user's message.
     - timestamp: The date and time when the message was exchanged.
+    - model: The model that produced the response, as reported by the provider.
+    - prompt_tokens / completion_tokens: Token usage of the upstream call; 0 when the
+      response came from the completion cache. Streamed responses are counted locally.
+    - latency_ms: Time the upstream call took.
     """
 
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        db.Index("ix_chat_messages_user_id_timestamp", "user_id", "timestamp"),
+        db.Index("ix_chat_messages_session_id_timestamp", "session_id", "timestamp"),
+        db.Index("ix_chat_messages_session_id_id", "session_id", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user_auth.id"), nullable=False)
@@ -145,9 +173,85 @@ class ChatMessage(db.Model, SerializerMixin):
     response = db.Column(db.Text, nullable=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     session_id = db.Column(db.Integer, db.ForeignKey("user_sessions.id"), nullable=True)
+    model = db.Column(db.String(64), nullable=True)
+    prompt_tokens = db.Column(db.Integer, nullable=True)
+    completion_tokens = db.Column(db.Integer, nullable=True)
+    latency_ms = db.Column(db.Integer, nullable=True)
     session = db.relationship("UserSession", backref="chat_messages")
 
     user = db.relationship("UserAuth", back_populates="chat_messages")
 
     def __repr__(self):
         return f"<ChatMessage {self.id} User ID: {self.user_id}>"
+
+
+# Full-text index over message and response, created and dropped with the table.
+install_search_index(ChatMessage.__table__)
+
+
+class UserDailyUsage(db.Model, SerializerMixin):
+    """
+    Per-user, per-day totals of chat usage, kept up to date as messages are inserted
+    so dashboards and quota checks read one row instead of scanning chat_messages.
+
+    Fields:
+    - user_id, day: Primary key; day is the UTC date of the messages.
+    - message_count: Number of chat messages.
+    - prompt_tokens / completion_tokens: Summed token usage.
+    - latency_ms: Summed upstream latency.
+    """
+
+    __tablename__ = "user_daily_usage"
+
+    COUNTERS = ("message_count", "prompt_tokens", "completion_tokens", "latency_ms")
+
+    user_id = db.Column(db.Integer, db.ForeignKey("user_auth.id"), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    message_count = db.Column(db.Integer, nullable=False, default=0)
+    prompt_tokens = db.Column(db.Integer, nullable=False, default=0)
+    completion_tokens = db.Column(db.Integer, nullable=False, default=0)
+    latency_ms = db.Column(db.Integer, nullable=False, default=0)
+
+    user = db.relationship("UserAuth", back_populates="daily_usage")
+
+    serialize_rules = ("-user",)
+
+    @classmethod
+    def increment(cls, connection, chat_messages):
+        """
+        Adds `chat_messages` to their users' daily totals, with one upsert row per
+        user and day, inside the caller's transaction.
+
+        Args:
+        connection: A SQLAlchemy Connection or Session on SQLite or PostgreSQL.
+        chat_messages (list): ChatMessage objects with their timestamps set.
+        """
+        totals = {}
+        for chat_message in chat_messages:
+            key = (chat_message.user_id, chat_message.timestamp.date())
+            row = totals.get(key)
+            if row is None:
+                row = totals[key] = dict.fromkeys(cls.COUNTERS, 0)
+                row.update(user_id=key[0], day=key[1])
+            row["message_count"] += 1
+            row["prompt_tokens"] += chat_message.prompt_tokens or 0
+            row["completion_tokens"] += chat_message.completion_tokens or 0
+            row["latency_ms"] += chat_message.latency_ms or 0
+        if not totals:
+            return
+
+        bind = connection.get_bind() if hasattr(connection, "get_bind") else connection
+        dialect = bind.dialect.name
+        insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+        statement = insert(cls.__table__)
+        statement = statement.on_conflict_do_update(
+            index_elements=["user_id", "day"],
+            set_={
+                name: cls.__table__.c[name] + statement.excluded[name]
+                for name in cls.COUNTERS
+            },
+        )
+        connection.execute(statement, list(totals.values()))
+
+    def __repr__(self):
+        return f"<UserDailyUsage User ID: {self.user_id} {self.day}>"
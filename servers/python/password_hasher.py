@@ -0,0 +1,129 @@
+# Runs bcrypt hashing and verification on a dedicated, size-limited worker pool.
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import histogram
+
+BCRYPT_SECONDS = histogram(
+    "bcrypt_duration_seconds",
+    "Time spent hashing or verifying a password, excluding time queued.",
+    ["operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing queue is full and the request should be shed."""
+
+
+class PasswordHasher:
+    """
+    Isolates bcrypt CPU cost from the request threads.
+
+    bcrypt releases the GIL while it works, so a small thread pool gives true
+    parallelism while capping how many cores auth can consume at once. At most
+    `max_queue` operations may be pending (queued or running); beyond that new
+    work is rejected with PasswordHasherBusy instead of stalling every request
+    in the worker behind a login burst.
+
+    Args:
+    bcrypt: A flask_bcrypt.Bcrypt instance.
+    rounds (int): The bcrypt cost factor used for new hashes.
+    max_workers (int): Number of threads running bcrypt concurrently.
+    max_queue (int): Maximum number of pending operations.
+    """
+
+    def __init__(self, bcrypt, rounds=12, max_workers=2, max_queue=64):
+        self.bcrypt = bcrypt
+        self.rounds = rounds
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="bcrypt"
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._dummy_hash = None
+        self.completed = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_config(cls, config, bcrypt):
+        return cls(
+            bcrypt,
+            rounds=config["BCRYPT_LOG_ROUNDS"],
+            max_workers=config["BCRYPT_WORKERS"],
+            max_queue=config["BCRYPT_MAX_QUEUE"],
+        )
+
+    @property
+    def queue_depth(self):
+        """Number of operations queued or running right now."""
+        return self._pending
+
+    def hash(self, password):
+        """Returns the bcrypt hash of `password` at the configured cost, as text."""
+        return self._run("hash", self._hash, password)
+
+    def verify(self, password_hash, password):
+        """Returns True if `password` matches `password_hash`."""
+        return self._run(
+            "verify", self.bcrypt.check_password_hash, password_hash, password
+        )
+
+    def verify_unknown_user(self, password):
+        """
+        Spends the same bcrypt work as `verify` for a username that does not exist,
+        so response times do not reveal which usernames are registered.
+
+        Returns:
+        bool: Always False.
+        """
+        if self._dummy_hash is None or self.needs_rehash(self._dummy_hash):
+            self._dummy_hash = self.hash("not-a-real-password")
+        self.verify(self._dummy_hash, password)
+        return False
+
+    def needs_rehash(self, password_hash):
+        """
+        Returns True if `password_hash` was made with a different cost factor than
+        the configured one, so it should be replaced after a successful login.
+        """
+        try:
+            return int(password_hash.split("$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def stats(self):
+        return {
+            "queue_depth": self._pending,
+            "max_queue": self.max_queue,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "rounds": self.rounds,
+        }
+
+    def _hash(self, password):
+        return self.bcrypt.generate_password_hash(password, self.rounds).decode("utf-8")
+
+    def _timed(self, name, operation, *args):
+        with BCRYPT_SECONDS.labels(name).time():
+            return operation(*args)
+
+    def _run(self, name, operation, *args):
+        with self._lock:
+            if self._pending >= self.max_queue:
+                self.rejected += 1
+                raise PasswordHasherBusy(
+                    f"{self._pending} password operations already pending"
+                )
+            self._pending += 1
+        try:
+            return self._executor.submit(self._timed, name, operation, *args).result()
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self.completed += 1
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
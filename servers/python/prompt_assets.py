@@ -0,0 +1,148 @@
+# In-process cache for the text assets (system prompts, guides) sent to the LLM.
+
+import os
+import signal
+import threading
+import time
+
+
+class PromptAssetCache:
+    """
+    Caches named prompt assets in memory so chat requests never touch the disk.
+
+    Assets are registered once by name and loaded eagerly. Each worker process holds
+    a single shared copy of every asset, optionally parsed into a precomputed form
+    such as a search index. A cached asset is re-read, and parsed again, only when
+    its file modification time changes (checked at most once per `check_interval`
+    seconds) or when `reload()` is called, e.g. from a SIGUSR2 handler.
+
+    Hits and misses are counted so cache effectiveness can be reported.
+    """
+
+    def __init__(self, check_interval=5.0):
+        self.check_interval = check_interval
+        self._assets = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, name, path, preload=True, parse=None):
+        """
+        Registers a prompt asset under `name`, loading it immediately unless `preload` is False.
+
+        Args:
+        name (str): The key used to look the asset up.
+        path (str or Path): Location of the asset on disk.
+        preload (bool): Whether to read the file now instead of on first use.
+        parse (callable): Optional function turning the text into the value `get`
+            returns; called once per version of the file.
+        """
+        with self._lock:
+            self._assets[name] = {
+                "path": os.fspath(path),
+                "parse": parse,
+                "text": None,
+                "mtime": None,
+                "checked_at": 0.0,
+            }
+        if preload:
+            self.get(name)
+
+    def get(self, name):
+        """
+        Returns the text of a registered asset, re-reading it only if it changed on disk.
+
+        Args:
+        name (str): The registered asset name.
+
+        Returns:
+        The asset text, or an empty string if the file cannot be read, passed
+        through the asset's `parse` function if it has one.
+
+        Raises:
+        KeyError: If no asset has been registered under `name`.
+        """
+        entry = self._assets[name]
+        now = time.monotonic()
+
+        if (
+            entry["text"] is not None
+            and now - entry["checked_at"] < self.check_interval
+        ):
+            with self._lock:
+                self.hits += 1
+            return entry["text"]
+
+        with self._lock:
+            mtime = self._stat(entry["path"])
+            entry["checked_at"] = now
+            if entry["text"] is not None and mtime == entry["mtime"]:
+                self.hits += 1
+                return entry["text"]
+
+            self.misses += 1
+            text = self._read(entry["path"])
+            entry["text"] = entry["parse"](text) if entry["parse"] else text
+            entry["mtime"] = mtime
+            return entry["text"]
+
+    def reload(self, name=None):
+        """
+        Forces one asset (or every asset when `name` is None) to be re-read on next use.
+        """
+        with self._lock:
+            names = [name] if name else list(self._assets)
+            for asset_name in names:
+                self._assets[asset_name]["text"] = None
+                self._assets[asset_name]["mtime"] = None
+
+    def stats(self):
+        """Returns hit/miss counters and the names of the registered assets."""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / total if total else 0.0,
+            "assets": sorted(self._assets),
+        }
+
+    @staticmethod
+    def _stat(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                return file.read()
+        except FileNotFoundError:
+            print(f"The file {path} was not found.")
+        except Exception as e:
+            print(f"An error occurred while reading the file: {e}")
+        return ""
+
+
+def install_reload_signal(cache, signum=getattr(signal, "SIGUSR2", None)):
+    """
+    Reloads every asset in `cache` when the process receives `signum` (SIGUSR2 by default).
+
+    SIGUSR2 is used because gunicorn workers leave it free, while SIGHUP is the
+    master's signal to replace its workers. Signal handlers can only be installed
+    from the main thread; elsewhere, or on platforms without SIGUSR2, this is a
+    no-op and mtime checks remain the only trigger.
+
+    Returns:
+    bool: True if the handler was installed.
+    """
+    if signum is None:
+        return False
+    try:
+        signal.signal(signum, lambda *_: cache.reload())
+    except ValueError:
+        return False
+    return True
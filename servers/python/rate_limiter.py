@@ -0,0 +1,195 @@
+# Token-bucket rate limiting, used to shed login floods before any bcrypt work runs.
+
+import itertools
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryBucketStore:
+    """
+    Per-process token buckets, keyed by string.
+
+    The table is capped at `max_keys` entries so a flood of distinct usernames or
+    addresses cannot grow memory without bound. Buckets that have refilled
+    completely are evicted first, as forgetting them changes nothing; a drained
+    bucket is only evicted, least recently used first, when none of the oldest
+    entries is full, so spraying new keys has to outnumber the whole table of
+    refilling buckets before it can reset one. New keys are always remembered,
+    so a saturated table never stops throttling them.
+    """
+
+    # Oldest entries examined for eviction per new key, so a table full of
+    # refilling buckets does not cost a full scan on every attempt.
+    EVICTION_SCAN = 32
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, refill_rate, cost):
+        """
+        Refills the bucket for `key`, then removes `cost` tokens if available.
+
+        A `cost` of 0 only checks whether one token is available.
+
+        Returns:
+        float: 0 if the request is allowed, otherwise seconds until it would be.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at, _ = self._buckets.get(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated_at) * refill_rate)
+            needed = max(cost, 1)
+            retry_after = 0.0
+            if tokens >= needed:
+                tokens -= cost
+            else:
+                retry_after = (needed - tokens) / refill_rate
+
+            if key not in self._buckets and len(self._buckets) >= self.max_keys:
+                self._evict(now)
+            full_at = now + (capacity - tokens) / refill_rate
+            self._buckets[key] = (tokens, now, full_at)
+            self._buckets.move_to_end(key)
+            return retry_after
+
+    def _evict(self, now):
+        # Least recently used first; buckets refill at different rates, so a
+        # full bucket may sit behind one that is still refilling.
+        full = [
+            key
+            for key, (_, _, full_at) in itertools.islice(
+                self._buckets.items(), self.EVICTION_SCAN
+            )
+            if full_at <= now
+        ]
+        for key in full:
+            del self._buckets[key]
+        if not full:
+            self._buckets.popitem(last=False)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RedisBucketStore:
+    """
+    Token buckets shared by every worker and host through a Redis server.
+    Keys expire once their bucket would be full again, so memory stays bounded.
+    """
+
+    SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local cost = tonumber(ARGV[3])
+    local now = tonumber(ARGV[4])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + (now - ts) * rate)
+    local needed = math.max(cost, 1)
+    local retry = 0
+    if tokens >= needed then
+        tokens = tokens - cost
+    else
+        retry = (needed - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return tostring(retry)
+    """
+
+    def __init__(self, url, prefix="ratelimit:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError(
+                "LOGIN_LIMITER_URL is set but the 'redis' package is not installed."
+            ) from e
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._script = self.client.register_script(self.SCRIPT)
+
+    def take(self, key, capacity, refill_rate, cost):
+        retry_after = self._script(
+            keys=[self.prefix + key],
+            args=[capacity, refill_rate, cost, time.time()],
+        )
+        return float(retry_after)
+
+
+class LoginThrottle:
+    """
+    Throttles login attempts by client address and by username.
+
+    Every attempt spends a token from its address bucket. Failed attempts also
+    spend a token from the username bucket, so guessing one account's password is
+    slowed down from any number of addresses while its owner's own successful
+    logins are not counted. Both buckets are checked before the user is looked up
+    or any password is hashed.
+
+    Buckets always live in process; when a shared store is given they are
+    checked there as well, so limits also hold across workers and hosts.
+    """
+
+    def __init__(
+        self,
+        store,
+        shared_store=None,
+        username_burst=5,
+        username_per_minute=5,
+        ip_burst=10,
+        ip_per_minute=30,
+    ):
+        self.stores = [store] + ([shared_store] if shared_store else [])
+        self.username_limit = (username_burst, username_per_minute / 60)
+        self.ip_limit = (ip_burst, ip_per_minute / 60)
+        self.throttled = 0
+
+    @classmethod
+    def from_config(cls, config):
+        url = config.get("LOGIN_LIMITER_URL")
+        return cls(
+            MemoryBucketStore(max_keys=config["LOGIN_LIMITER_MAX_KEYS"]),
+            shared_store=RedisBucketStore(url) if url else None,
+            username_burst=config["LOGIN_USERNAME_BURST"],
+            username_per_minute=config["LOGIN_USERNAME_PER_MINUTE"],
+            ip_burst=config["LOGIN_IP_BURST"],
+            ip_per_minute=config["LOGIN_IP_PER_MINUTE"],
+        )
+
+    def check(self, username, ip):
+        """
+        Records a login attempt and decides whether it may proceed.
+
+        Returns:
+        int: 0 if the attempt is allowed, otherwise the whole seconds the client
+        should wait before retrying.
+        """
+        retry_after = max(
+            self._take(f"login:ip:{ip}", self.ip_limit, cost=1),
+            self._take(f"login:user:{username}", self.username_limit, cost=0),
+        )
+        if retry_after:
+            self.throttled += 1
+        return math.ceil(retry_after)
+
+    def record_failure(self, username):
+        """Charges a failed attempt to the username bucket."""
+        self._take(f"login:user:{username}", self.username_limit, cost=1)
+
+    def _take(self, key, limit, cost):
+        capacity, refill_rate = limit
+        retry_after = 0.0
+        for store in self.stores:
+            try:
+                retry_after = max(
+                    retry_after, store.take(key, capacity, refill_rate, cost)
+                )
+            except Exception as e:
+                # An unreachable shared store must not lock everyone out.
+                print(f"Rate limiter error: {e}")
+        return retry_after
@@ -1,17 +1,27 @@
+import argparse
+import math
+import os
 import random
-from datetime import datetime
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from functools import lru_cache
+from multiprocessing import Pool
 
 from faker import Faker
-from flask_bcrypt import Bcrypt
-from models import ChatMessage, UserAuth
+from models import ChatMessage, UserAuth, UserDailyUsage, UserSession
+from sqlalchemy import create_engine, func, select, text
 
-from app import app, db
+from config import bcrypt, create_app, db
+
+# Seeding only needs the models and the database, not the views or the LLM stack
+app = create_app(views=False)
 
 # Instantiate Faker
 fake = Faker()
 
-# Setup bcrypt
-bcrypt = Bcrypt(app)
+# Password is set to '123456' for all seeded users
+SEED_PASSWORD = "123456"
 
 
 def seed_database():
@@ -20,18 +30,20 @@ def seed_database():
         db.drop_all()
         db.create_all()
 
+        # Every user shares the same password, so it is hashed once
+        password_hash = bcrypt.generate_password_hash(SEED_PASSWORD).decode("utf-8")
+
         # Create fake data for UserAuth
         for _ in range(10):  # Adjust the number of users as needed
             username = fake.user_name()
             email = fake.email()
-            # Password is set to '123456' for all users
-            password_hash = bcrypt.generate_password_hash("123456").decode("utf-8")
 
             user = UserAuth(username=username, email=email, password_hash=password_hash)
             db.session.add(user)
             db.session.commit()
 
             # Create fake chat messages for the user
+            chat_messages = []
             for _ in range(5):  # Adjust the number of messages as needed
                 message = fake.sentence()
                 response = fake.sentence()
@@ -44,11 +56,329 @@ def seed_database():
                     timestamp=timestamp,
                 )
                 db.session.add(chat_message)
+                chat_messages.append(chat_message)
 
+            # Keeps the usage rollup in step with the messages, as the app does
+            UserDailyUsage.increment(db.session, chat_messages)
             db.session.commit()
 
         print("Database seeded successfully!")
 
 
+# Bulk seeding ---------------------------------------------------------------
+#
+# Generates benchmark-scale datasets (e.g. 100k users, 50M messages) with Core
+# multi-row INSERTs. User and session ids are assigned up front, so chunks of
+# users can be generated and inserted by independent worker processes.
+
+SeedMessage = namedtuple(
+    "SeedMessage",
+    "user_id session_id message response timestamp model "
+    "prompt_tokens completion_tokens latency_ms",
+)
+
+SeedPlan = namedtuple(
+    "SeedPlan",
+    "database_uri first_user_id user_count first_session_id sessions_per_user "
+    "password_hash options seed",
+)
+
+
+def sample_count(rng, distribution, mean):
+    """
+    Draws a positive count with the given mean.
+
+    Distributions: "fixed", "uniform" (1 to 2 * mean - 1), "geometric"
+    (memoryless, many short runs) or "lognormal" (heavy tail: most small, a few
+    very large, which matches how chat usage is usually spread).
+    """
+    if distribution == "fixed" or mean <= 1:
+        return max(1, round(mean))
+    if distribution == "uniform":
+        return rng.randint(1, max(1, round(2 * mean - 1)))
+    if distribution == "geometric":
+        return 1 + int(rng.expovariate(1 / (mean - 1)))
+    if distribution == "lognormal":
+        sigma = 1.0
+        return max(1, round(rng.lognormvariate(math.log(mean) - sigma**2 / 2, sigma)))
+    raise ValueError(f"Unknown distribution: {distribution}")
+
+
+@lru_cache(maxsize=1)
+def text_pool(size, seed):
+    """
+    Pre-generates sentences once per process, since calling Faker per row
+    dominates at scale.
+    """
+    pool_faker = Faker()
+    pool_faker.seed_instance(seed)
+    return (
+        [pool_faker.sentence(nb_words=12) for _ in range(size)],
+        [pool_faker.paragraph(nb_sentences=3) for _ in range(size)],
+        [pool_faker.first_name().lower() for _ in range(min(size, 2000))],
+    )
+
+
+def seed_chunk(plan):
+    """
+    Generates and inserts one contiguous range of users, with their sessions and
+    messages, on its own engine. Safe to run in a worker process.
+
+    Returns:
+    tuple: The number of users, sessions and messages inserted.
+    """
+    options = plan.options
+    rng = random.Random(plan.seed)
+    messages, responses, names = text_pool(options.text_pool, options.seed)
+    now = datetime.utcnow()
+    span = timedelta(days=options.days).total_seconds()
+
+    engine = create_engine(plan.database_uri, connect_args=_connect_args(plan))
+    users, sessions, chat_messages = [], [], []
+    counts = [0, 0, 0]
+
+    def flush(connection):
+        if users:
+            connection.execute(UserAuth.__table__.insert(), users)
+        if sessions:
+            connection.execute(UserSession.__table__.insert(), sessions)
+        if chat_messages:
+            connection.execute(
+                ChatMessage.__table__.insert(),
+                [chat_message._asdict() for chat_message in chat_messages],
+            )
+            UserDailyUsage.increment(connection, chat_messages)
+        counts[0] += len(users)
+        counts[1] += len(sessions)
+        counts[2] += len(chat_messages)
+        users.clear()
+        sessions.clear()
+        chat_messages.clear()
+
+    with engine.connect() as connection:
+        session_id = plan.first_session_id
+        for offset, session_count in enumerate(plan.sessions_per_user):
+            user_id = plan.first_user_id + offset
+            users.append(
+                {
+                    "id": user_id,
+                    "username": f"{rng.choice(names)}{user_id}",
+                    "email": f"user{user_id}@example.com",
+                    "password_hash": plan.password_hash,
+                }
+            )
+
+            for index in range(session_count):
+                # Recency > 1 skews activity towards the present.
+                age = span * rng.random() ** options.recency
+                started_at = now - timedelta(seconds=age)
+                timestamp = started_at
+                for _ in range(
+                    sample_count(
+                        rng, options.message_distribution, options.messages_per_session
+                    )
+                ):
+                    timestamp += timedelta(
+                        seconds=rng.expovariate(1 / options.message_gap)
+                    )
+                    chat_messages.append(
+                        SeedMessage(
+                            user_id=user_id,
+                            session_id=session_id,
+                            message=rng.choice(messages),
+                            response=rng.choice(responses),
+                            timestamp=timestamp,
+                            model="gpt-3.5-turbo",
+                            prompt_tokens=rng.randint(200, 1200),
+                            completion_tokens=rng.randint(20, 150),
+                            latency_ms=int(rng.lognormvariate(6.9, 0.5)),
+                        )
+                    )
+                # The newest session of some users is still open.
+                is_open = index == session_count - 1 and rng.random() < 0.1
+                sessions.append(
+                    {
+                        "id": session_id,
+                        "user_id": user_id,
+                        "started_at": started_at,
+                        "ended_at": None if is_open else timestamp,
+                    }
+                )
+                session_id += 1
+
+            if len(chat_messages) >= options.batch_size:
+                with connection.begin():
+                    flush(connection)
+
+        with connection.begin():
+            flush(connection)
+
+    engine.dispose()
+    return tuple(counts)
+
+
+def _connect_args(plan):
+    if plan.database_uri.startswith("sqlite"):
+        # Parallel workers take turns on SQLite's single writer lock.
+        return {"timeout": 300}
+    return {}
+
+
+def plan_chunks(options, database_uri, first_user_id, first_session_id, password_hash):
+    """
+    Splits the users into chunks and assigns each chunk its session ids, drawing
+    every user's session count up front from a seeded generator.
+    """
+    rng = random.Random(options.seed)
+    plans = []
+    session_id = first_session_id
+    for chunk_start in range(0, options.users, options.chunk_users):
+        chunk_size = min(options.chunk_users, options.users - chunk_start)
+        sessions_per_user = [
+            sample_count(rng, options.session_distribution, options.sessions_per_user)
+            for _ in range(chunk_size)
+        ]
+        plans.append(
+            SeedPlan(
+                database_uri=database_uri,
+                first_user_id=first_user_id + chunk_start,
+                user_count=chunk_size,
+                first_session_id=session_id,
+                sessions_per_user=sessions_per_user,
+                password_hash=password_hash,
+                options=options,
+                seed=options.seed * 1000003 + chunk_start,
+            )
+        )
+        session_id += sum(sessions_per_user)
+    return plans
+
+
+def bulk_seed(options):
+    """Seeds a benchmark-scale dataset and reports progress as chunks complete."""
+    with app.app_context():
+        if options.reset:
+            db.drop_all()
+        db.create_all()
+
+        first_user_id = (db.session.scalar(select(func.max(UserAuth.id))) or 0) + 1
+        first_session_id = (
+            db.session.scalar(select(func.max(UserSession.id))) or 0
+        ) + 1
+        database_uri = db.engine.url.render_as_string(hide_password=False)
+        db.session.remove()
+        db.engine.dispose()
+
+    password_hash = bcrypt.generate_password_hash(
+        SEED_PASSWORD, options.bcrypt_rounds
+    ).decode("utf-8")
+    plans = plan_chunks(
+        options, database_uri, first_user_id, first_session_id, password_hash
+    )
+
+    started = time.perf_counter()
+    totals = [0, 0, 0]
+
+    def report(counts):
+        for index, count in enumerate(counts):
+            totals[index] += count
+        elapsed = time.perf_counter() - started
+        rate = totals[2] / elapsed if elapsed else 0
+        remaining = (options.users - totals[0]) / (totals[0] / elapsed)
+        print(
+            f"{totals[0]}/{options.users} users, {totals[1]} sessions, "
+            f"{totals[2]} messages ({rate:,.0f} messages/s, ~{remaining:.0f}s left)",
+            flush=True,
+        )
+
+    if options.workers > 1:
+        with Pool(options.workers) as pool:
+            for counts in pool.imap_unordered(seed_chunk, plans):
+                report(counts)
+    else:
+        for plan in plans:
+            report(seed_chunk(plan))
+
+    if database_uri.startswith("postgresql"):
+        # Ids were assigned explicitly, so move the sequences past them.
+        with app.app_context(), db.engine.begin() as connection:
+            for table in ("user_auth", "user_sessions"):
+                connection.execute(
+                    text(
+                        f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                        f"(SELECT MAX(id) FROM {table}))"
+                    )
+                )
+
+    print(
+        f"Seeded {totals[0]} users, {totals[1]} sessions and {totals[2]} messages "
+        f"in {time.perf_counter() - started:.1f}s."
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Seeds the database. Without --users, recreates the tables with a "
+            "small demo dataset; with --users, bulk-seeds a benchmark-scale one."
+        )
+    )
+    parser.add_argument("--users", type=int, help="Number of users to bulk-seed.")
+    parser.add_argument("--sessions-per-user", type=float, default=5)
+    parser.add_argument(
+        "--session-distribution",
+        choices=["fixed", "uniform", "geometric", "lognormal"],
+        default="lognormal",
+    )
+    parser.add_argument("--messages-per-session", type=float, default=10)
+    parser.add_argument(
+        "--message-distribution",
+        choices=["fixed", "uniform", "geometric", "lognormal"],
+        default="lognormal",
+    )
+    parser.add_argument(
+        "--message-gap",
+        type=float,
+        default=45,
+        help="Mean seconds between messages within a session.",
+    )
+    parser.add_argument(
+        "--days", type=float, default=365, help="How far back sessions start."
+    )
+    parser.add_argument(
+        "--recency",
+        type=float,
+        default=2,
+        help="Skews session starts towards the present; 1 spreads them evenly.",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=20000,
+        help="Messages per INSERT transaction.",
+    )
+    parser.add_argument(
+        "--chunk-users", type=int, default=1000, help="Users per unit of work."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Worker processes; only useful on databases with concurrent writers.",
+    )
+    parser.add_argument("--text-pool", type=int, default=5000)
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--reset", action="store_true", help="Drop all tables before seeding."
+    )
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    seed_database()
+    options = parse_args()
+    if options.users:
+        options.workers = max(1, min(options.workers, os.cpu_count() or 1))
+        bulk_seed(options)
+    else:
+        seed_database()
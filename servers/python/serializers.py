@@ -0,0 +1,70 @@
+# Plain-dict serializers for read-only API responses. Marshmallow schemas remain
+# the path for validating input; these skip its per-field machinery when
+# formatting rows that are already valid.
+
+from operator import attrgetter
+
+
+def compile_serializer(fields, formatters=None):
+    """
+    Returns a function turning an object (a model instance or a result row) into
+    a dict of `fields`. The attribute lookups are compiled once into an
+    attrgetter, and `formatters` maps field names to functions applied to their
+    non-None values.
+    """
+    fields = tuple(fields)
+    getter = attrgetter(*fields)
+    if len(fields) == 1:
+        getter = lambda obj, get=getter: (get(obj),)
+    formatters = tuple((formatters or {}).items())
+
+    def serialize(obj):
+        data = dict(zip(fields, getter(obj)))
+        for name, formatter in formatters:
+            value = data[name]
+            if value is not None:
+                data[name] = formatter(value)
+        return data
+
+    return serialize
+
+
+def isoformat(value):
+    return value.isoformat()
+
+
+CHAT_MESSAGE_FIELDS = (
+    "id",
+    "user_id",
+    "session_id",
+    "message",
+    "response",
+    "model",
+    "prompt_tokens",
+    "completion_tokens",
+    "latency_ms",
+    "timestamp",
+)
+USER_FIELDS = ("id", "username", "email")
+SEARCH_RESULT_FIELDS = ("id", "session_id", "timestamp", "message", "response")
+
+# Same output as the former ChatMessageSchema: timestamps in ISO 8601.
+serialize_chat_message = compile_serializer(
+    CHAT_MESSAGE_FIELDS, {"timestamp": isoformat}
+)
+# Public account fields only; never the password hash.
+serialize_user = compile_serializer(USER_FIELDS)
+# Message and response hold highlighted snippets rather than the full text.
+serialize_search_result = compile_serializer(
+    SEARCH_RESULT_FIELDS, {"timestamp": isoformat}
+)
+
+
+def history_messages(chat_messages):
+    """Formats a page of ChatMessages as alternating user and bot entries."""
+    messages = []
+    append = messages.append
+    for chat_message in chat_messages:
+        append({"sender": "user", "text": chat_message.message})
+        append({"sender": "bot", "text": chat_message.response})
+    return messages
@@ -0,0 +1,315 @@
+# Pluggable server-side session storage, replacing the filesystem Flask-Session backend.
+
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask.sessions import SecureCookieSessionInterface, SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from metrics import histogram
+from werkzeug.datastructures import CallbackDict
+
+SESSION_STORE_SECONDS = histogram(
+    "session_store_duration_seconds",
+    "Time spent loading, saving or deleting a server-side session.",
+    ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+)
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session data held in a store; only the signed session id travels in the cookie."""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+
+class SQLiteSessionStore:
+    """
+    Sessions in a local SQLite database in WAL mode, one connection per thread.
+    Shared by every worker process on the host. Triggers count every write and
+    delete in a one-row generation table, so caches can tell when to reload.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS sessions "
+                "(sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_sessions_expires_at "
+                "ON sessions (expires_at)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS sessions_generation "
+                "(value INTEGER NOT NULL)"
+            )
+            connection.execute(
+                "INSERT INTO sessions_generation (value) SELECT 0 "
+                "WHERE NOT EXISTS (SELECT 1 FROM sessions_generation)"
+            )
+            # INSERT OR REPLACE fires the insert trigger only, as recursive
+            # triggers are off.
+            for operation in ("INSERT", "DELETE"):
+                connection.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS sessions_{operation.lower()} "
+                    f"AFTER {operation} ON sessions BEGIN "
+                    "UPDATE sessions_generation SET value = value + 1; END"
+                )
+
+    def _connect(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def load(self, sid):
+        row = (
+            self._connect()
+            .execute(
+                "SELECT data FROM sessions WHERE sid = ? AND expires_at > ?",
+                (sid, time.time()),
+            )
+            .fetchone()
+        )
+        return row[0] if row else None
+
+    def save(self, sid, data, ttl):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO sessions (sid, data, expires_at) VALUES (?, ?, ?)",
+            (sid, data, time.time() + ttl),
+        )
+
+    def delete(self, sid):
+        self._connect().execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def generation(self):
+        """A counter that changes whenever any session is written or deleted."""
+        return (
+            self._connect()
+            .execute("SELECT value FROM sessions_generation")
+            .fetchone()[0]
+        )
+
+    def sweep(self):
+        """Deletes expired sessions and returns how many were removed."""
+        cursor = self._connect().execute(
+            "DELETE FROM sessions WHERE expires_at <= ?", (time.time(),)
+        )
+        return cursor.rowcount
+
+
+class RedisSessionStore:
+    """
+    Sessions in any server speaking the Redis protocol; shared across hosts.
+    Redis expires keys itself, so sweeping is a no-op. Writes and deletes also
+    increment a generation key, so caches can tell when to reload.
+    """
+
+    def __init__(self, url, prefix="session:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError(
+                "SESSION_BACKEND is 'redis' but the 'redis' package is not installed."
+            ) from e
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def load(self, sid):
+        data = self.client.get(self.prefix + sid)
+        return data.decode("utf-8") if data is not None else None
+
+    def save(self, sid, data, ttl):
+        pipeline = self.client.pipeline()
+        pipeline.set(self.prefix + sid, data, ex=int(ttl))
+        pipeline.incr(self.prefix + "generation")
+        pipeline.execute()
+
+    def delete(self, sid):
+        pipeline = self.client.pipeline()
+        pipeline.delete(self.prefix + sid)
+        pipeline.incr(self.prefix + "generation")
+        pipeline.execute()
+
+    def generation(self):
+        """A counter that changes whenever any session is written or deleted."""
+        return int(self.client.get(self.prefix + "generation") or 0)
+
+    def sweep(self):
+        return 0
+
+
+class CachedSessionStore:
+    """
+    In-process read cache in front of another store.
+
+    Writes and deletes go through to the store and drop the entry. Each entry
+    remembers the store's generation when it was read, and a hit is only served
+    while the generation is unchanged, so a logout or login on another worker
+    takes effect here on the next request. Checking the generation is a single
+    tiny read, cheaper than loading and expiring the session itself. Entries
+    also live for at most `ttl` seconds.
+    """
+
+    def __init__(self, store, max_entries=10000, ttl=5.0):
+        self.store = store
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, sid):
+        now = time.monotonic()
+        # Read before the session, so a write landing in between is caught by
+        # the next load instead of being cached under the newer generation.
+        generation = self.store.generation()
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry and entry[1] > now and entry[2] == generation:
+                self._entries.move_to_end(sid)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        data = self.store.load(sid)
+        if data is not None:
+            self._remember(sid, data, generation)
+        return data
+
+    def save(self, sid, data, ttl):
+        # The write bumps the store's generation, so the next load reads through.
+        self.store.save(sid, data, ttl)
+        with self._lock:
+            self._entries.pop(sid, None)
+
+    def delete(self, sid):
+        self.store.delete(sid)
+        with self._lock:
+            self._entries.pop(sid, None)
+
+    def sweep(self):
+        return self.store.sweep()
+
+    def _remember(self, sid, data, generation):
+        with self._lock:
+            self._entries[sid] = (data, time.monotonic() + self.ttl, generation)
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class StoreSessionInterface(SessionInterface):
+    """
+    Flask session interface backed by a session store.
+
+    The cookie carries only a random session id signed with the app's secret
+    key; the data is JSON in the store. A store write happens only when the
+    session was modified, and expired sessions are swept at most once per
+    `sweep_interval` seconds from within a request.
+    """
+
+    def __init__(self, store, sweep_interval=300.0):
+        self.store = store
+        self.sweep_interval = sweep_interval
+        self._last_sweep = time.monotonic()
+        self._sweep_lock = threading.Lock()
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt="session-id")
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode("utf-8")
+            except BadSignature:
+                sid = None
+            if sid:
+                with SESSION_STORE_SECONDS.labels("load").time():
+                    data = self.store.load(sid)
+                if data is not None:
+                    return ServerSideSession(json.loads(data), sid=sid)
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if not session.new:
+                with SESSION_STORE_SECONDS.labels("delete").time():
+                    self.store.delete(session.sid)
+            if session.modified:
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if session.modified or self.should_set_cookie(app, session):
+            ttl = app.permanent_session_lifetime.total_seconds()
+            with SESSION_STORE_SECONDS.labels("save").time():
+                self.store.save(session.sid, json.dumps(dict(session)), ttl)
+            response.set_cookie(
+                name,
+                self._signer(app).sign(session.sid.encode("utf-8")).decode("utf-8"),
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+            response.vary.add("Cookie")
+
+        with self._sweep_lock:
+            sweep_due = time.monotonic() - self._last_sweep > self.sweep_interval
+            if sweep_due:
+                self._last_sweep = time.monotonic()
+        if sweep_due:
+            self.store.sweep()
+
+
+def init_session_store(app):
+    """
+    Installs the session interface selected by SESSION_BACKEND:
+
+    - "cookie": stateless sessions signed into the cookie itself (no storage).
+    - "sqlite": server-side sessions in the SQLite file at SESSION_SQLITE_PATH.
+    - "redis": server-side sessions at SESSION_REDIS_URL.
+
+    Server-side backends get an in-process read cache of SESSION_CACHE_TTL seconds.
+    """
+    backend = app.config["SESSION_BACKEND"]
+    if backend == "cookie":
+        app.session_interface = SecureCookieSessionInterface()
+        return app.session_interface
+
+    if backend == "sqlite":
+        os.makedirs(os.path.dirname(app.config["SESSION_SQLITE_PATH"]), exist_ok=True)
+        store = SQLiteSessionStore(app.config["SESSION_SQLITE_PATH"])
+    elif backend == "redis":
+        store = RedisSessionStore(app.config["SESSION_REDIS_URL"])
+    else:
+        raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
+
+    if app.config["SESSION_CACHE_TTL"] > 0:
+        store = CachedSessionStore(store, ttl=app.config["SESSION_CACHE_TTL"])
+    app.session_interface = StoreSessionInterface(store)
+    return app.session_interface
@@ -0,0 +1,137 @@
+# Per-request SQL instrumentation: query counts, database time, slow requests and
+# N+1 suspects, collected from SQLAlchemy engine events.
+
+import time
+from collections import Counter
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryProfile:
+    """The statements one request sent to the database, and how long they took."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement = None
+        self.statements = Counter()
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.total_time += duration
+        self.statements[statement] += 1
+        if duration > self.slowest_time:
+            self.slowest_time = duration
+            self.slowest_statement = statement
+
+    def repeated(self, threshold):
+        """
+        Returns the statements issued at least `threshold` times, most frequent
+        first. The same SQL text with different parameters, run over and over, is
+        the usual signature of an N+1 query pattern.
+        """
+        return [
+            (statement, count)
+            for statement, count in self.statements.most_common()
+            if count >= threshold
+        ]
+
+    def elapsed(self):
+        return time.perf_counter() - self.started_at
+
+    def server_timing(self):
+        """Formats the profile as a Server-Timing header value."""
+        return (
+            f'db;dur={self.total_time * 1000:.1f};desc="{self.count} queries", '
+            f"app;dur={self.elapsed() * 1000:.1f}"
+        )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's own execution context, so a statement that fails
+    # leaves nothing behind for the next one to pick up.
+    context._query_started_at = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started_at = getattr(context, "_query_started_at", None)
+    if started_at is not None and has_request_context():
+        profile = g.get("sql_profile")
+        if profile is not None:
+            profile.record(statement, time.perf_counter() - started_at)
+
+
+def _shorten(statement, length=200):
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= length else statement[:length] + "..."
+
+
+def init_sql_profiler(app):
+    """
+    Profiles the SQL issued by every request when SQL_PROFILING is enabled.
+
+    - SQL_SERVER_TIMING adds a Server-Timing header with the database time and
+      query count, for browser dev tools. Meant for development, so when it is
+      not set it follows the app's debug mode at request time.
+    - Requests slower than SLOW_REQUEST_MS are logged with their query count,
+      database time and slowest statement.
+    - Statements repeated SQL_N_PLUS_ONE_THRESHOLD times or more within one
+      request are logged as N+1 suspects.
+
+    Streaming responses are logged once the stream ends, but their
+    Server-Timing header only covers the time before the first byte.
+    """
+    if not app.config["SQL_PROFILING"]:
+        return
+
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+    @app.before_request
+    def start_sql_profile():
+        g.sql_profile = QueryProfile()
+
+    @app.after_request
+    def finish_sql_profile(response):
+        profile = g.get("sql_profile")
+        if profile is None:
+            return response
+        server_timing = app.config["SQL_SERVER_TIMING"]
+        if server_timing is None:
+            server_timing = app.debug
+        if server_timing:
+            response.headers.add("Server-Timing", profile.server_timing())
+
+        method, path = request.method, request.path
+        if response.is_streamed:
+            # Queries keep running while the body streams; report once it ends.
+            response.call_on_close(lambda: _report(app, profile, method, path))
+        else:
+            _report(app, profile, method, path)
+        return response
+
+
+def _report(app, profile, method, path):
+    elapsed_ms = profile.elapsed() * 1000
+    if elapsed_ms >= app.config["SLOW_REQUEST_MS"]:
+        app.logger.warning(
+            "Slow request: %s %s took %.0fms with %d queries (%.0fms in the "
+            "database); slowest %.0fms: %s",
+            method,
+            path,
+            elapsed_ms,
+            profile.count,
+            profile.total_time * 1000,
+            profile.slowest_time * 1000,
+            _shorten(profile.slowest_statement or ""),
+        )
+
+    for statement, count in profile.repeated(app.config["SQL_N_PLUS_ONE_THRESHOLD"]):
+        app.logger.warning(
+            "Possible N+1: %s %s ran %dx: %s", method, path, count, _shorten(statement)
+        )
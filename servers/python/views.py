@@ -0,0 +1,1348 @@
+import atexit
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from chat_search import search_chat_messages, search_terms
+from context_builder import (
+    context_messages,
+    count_message_tokens,
+    count_tokens,
+    fold_summary,
+    pack_turns,
+)
+from compression import strip_encoding
+from conversation_cache import ConversationTail, Turn
+from flask import (
+    Blueprint,
+    Response,
+    current_app,
+    g,
+    jsonify,
+    make_response,
+    render_template,
+    request,
+    session,
+    stream_with_context,
+)
+from flask_marshmallow import fields
+from flask_restful import Api, Resource
+from guide_index import GuideIndex
+from json_provider import compact_dumps
+from llm_gateway import Completion, LLMGatewayBusy, LLMGatewayError
+from marshmallow import fields, validate
+from metrics import counter, gauge, histogram, registry
+from models import ChatMessage, UserAuth, UserDailyUsage, UserSession
+from password_hasher import PasswordHasherBusy
+from prompt_assets import PromptAssetCache, install_reload_signal
+from serializers import (
+    history_messages,
+    serialize_chat_message,
+    serialize_search_result,
+    serialize_user,
+)
+from sqlalchemy import or_
+from write_behind import WriteBehindFull, WriteBehindQueue
+
+from app_utils import (
+    decode_cursor,
+    encode_cursor,
+    make_etag,
+    parse_limit,
+    validate_not_blank,
+    validate_positive_number,
+    validate_type,
+)
+from config import (
+    completion_cache,
+    conversation_cache,
+    db,
+    llm_gateway,
+    login_throttle,
+    ma,
+    password_hasher,
+)
+
+script_dir = Path(__file__).parent
+file_path = script_dir / "data" / "support_guide.txt"
+
+# The API's views, registered on the app by create_app through init_views
+views = Blueprint("views", __name__)
+api = Api(views)
+
+# Prompt assets are read once per worker and re-read only when the file changes
+# on disk or the process receives SIGUSR2.
+prompt_assets = PromptAssetCache()
+
+
+@views.route("/")
+def index():
+    return render_template("index.html")
+
+
+@views.app_errorhandler(404)
+def not_found(e):
+    return render_template("index.html")
+
+
+# User Authentication Resources
+# ------------------------------
+
+
+class UserAuthSchema(ma.SQLAlchemyAutoSchema):
+    """
+    Marshmallow schema for serializing and deserializing UserAuth instances.
+    Facilitates user input validation upon registration and formats output for API responses.
+    Excludes the password_hash field from serialization for security.
+    """
+
+    class Meta:
+        model = UserAuth
+        load_instance = True
+        exclude = ("password_hash",)  # Excludes sensitive information from the output.
+
+    # Ensures passwords are at least 6 characters long, enhancing basic security.
+    password = fields.Str(
+        load_only=True, required=True, validate=validate.Length(min=6)
+    )
+
+
+class UserAuthResource(Resource):
+    """
+    RESTful resource for managing UserAuth entities, supporting operations like retrieval, creation, and deletion of user accounts.
+    """
+
+    page_size = 100
+    max_page_size = 1000
+    export_batch_size = 1000
+
+    def get(self):
+        """
+        Returns user accounts, excluding sensitive password hashes.
+
+        By default a page of `limit` users with ids greater than the `after` cursor
+        is returned, together with the cursor of the next page. Clients that accept
+        `application/x-ndjson` (or pass `format=ndjson`) instead receive every user
+        as one JSON object per line, streamed from a server-side cursor so exports
+        run in constant memory regardless of table size.
+
+        Only administrators, the users named in ADMIN_USERNAMES, may list accounts.
+        """
+        error = admin_error_response()
+        if error:
+            return error
+
+        if wants_ndjson():
+            return self.export()
+
+        try:
+            limit = parse_limit(
+                request.args.get("limit"), self.page_size, self.max_page_size
+            )
+            after = request.args.get("after")
+            after = validate_type(after, "after", int) if after is not None else None
+        except ValueError as error:
+            return make_response(jsonify({"error": str(error)}), 400)
+
+        query = db.session.query(UserAuth.id, UserAuth.username, UserAuth.email)
+        if after is not None:
+            query = query.filter(UserAuth.id > after)
+        users = query.order_by(UserAuth.id).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(users) > limit:
+            users = users[:limit]
+            next_cursor = users[-1].id
+
+        # Accounts have no modification time, so the page's rows themselves
+        # version it; a match still skips serializing and sending them.
+        etag = make_etag(
+            request.endpoint, limit, after, [tuple(user) for user in users]
+        )
+        not_modified = not_modified_response(etag)
+        if not_modified:
+            return not_modified
+
+        return revalidated_response(
+            jsonify(
+                {
+                    "users": [serialize_user(user) for user in users],
+                    "next_cursor": next_cursor,
+                }
+            ),
+            etag,
+        )
+
+    def export(self):
+        """Streams every user account as newline-delimited JSON."""
+        statement = (
+            db.select(UserAuth.id, UserAuth.username, UserAuth.email)
+            .order_by(UserAuth.id)
+            .execution_options(yield_per=self.export_batch_size)
+        )
+
+        def generate():
+            for user in db.session.execute(statement):
+                yield compact_dumps(serialize_user(user)) + "\n"
+
+        return Response(
+            stream_with_context(generate()), mimetype="application/x-ndjson"
+        )
+
+    def post(self):
+        """Creates a new user account with provided username, email, and password."""
+        user_data = request.get_json()
+
+        if not user_data:
+            return make_response(jsonify({"error": "No input data provided"}), 400)
+
+        username = user_data.get("username").lower()
+        email = user_data.get("email")
+        password = user_data.get("password")
+
+        if not all([username, email, password]):
+            return make_response(
+                jsonify({"error": "Missing username, email, or password"}), 400
+            )
+
+        if len(password) < 6:
+            return make_response(
+                jsonify({"error": "Password must be at least 6 characters long"}), 400
+            )
+
+        if UserAuth.query.filter_by(username=username).first():
+            return make_response(jsonify({"error": "Username already exists"}), 409)
+
+        if UserAuth.query.filter_by(email=email).first():
+            return make_response(jsonify({"error": "Email already exists"}), 409)
+
+        try:
+            hashed_password = password_hasher.hash(password)
+        except PasswordHasherBusy:
+            return auth_busy_response()
+
+        new_user = UserAuth(
+            username=username, email=email, password_hash=hashed_password
+        )
+        db.session.add(new_user)
+        db.session.commit()
+
+        new_user_session = UserSession(
+            user_id=new_user.id, started_at=datetime.utcnow()
+        )
+        db.session.add(new_user_session)
+        db.session.commit()
+
+        session["user_id"] = new_user.id
+        session["username"] = new_user.username
+        session["logged_in"] = True
+        session["session_id"] = new_user_session.id
+
+        return make_response(
+            jsonify(
+                {
+                    "message": "User created successfully and logged in",
+                    "id": new_user.id,
+                    "username": new_user.username,
+                    "email": new_user.email,
+                    "session_id": new_user_session.id,
+                }
+            ),
+            201,
+        )
+
+    def delete(self):
+        """Deletes a user account after verifying provided credentials."""
+        try:
+            data = request.get_json()
+            if not all(key in data for key in ("username", "password")):
+                return make_response(
+                    {"error": "Username and password are required"}, 400
+                )
+
+            username = data["username"].lower()
+            password = data["password"]
+
+            user = UserAuth.query.filter_by(username=username).first()
+
+            if user and password_hasher.verify(user.password_hash, password):
+                user_id = user.id
+                chat_writer = running_chat_writer()
+                if chat_writer is not None:
+                    # Queued messages reference the user; write them before the cascade.
+                    chat_writer.drain()
+                db.session.delete(user)
+                db.session.commit()
+                conversation_cache.invalidate(user_id)
+                session.clear()
+                return make_response({"message": "User deleted successfully"}, 200)
+            elif user:
+                return make_response({"error": "Incorrect password"}, 401)
+            else:
+                return make_response({"error": "User not found"}, 404)
+        except PasswordHasherBusy:
+            return auth_busy_response()
+        except Exception as error:
+            return make_response({"error": str(error)}, 500)
+
+    def patch(self):
+        """Updates a user's password after verifying the current password."""
+        data = request.get_json()
+        username = data["username"].lower()
+        user = UserAuth.query.filter_by(username=username).first()
+        try:
+            if user and password_hasher.verify(user.password_hash, data["password"]):
+                user.password_hash = password_hasher.hash(data["newPassword"])
+                db.session.commit()
+                return make_response({"message": "Password updated successfully"}, 200)
+            else:
+                return make_response({"error": "Invalid credentials"}, 401)
+        except PasswordHasherBusy:
+            return auth_busy_response()
+
+
+class UserLoginResource(Resource):
+    """
+    Handles user login requests by validating provided credentials.
+    Successful login creates a user session.
+    """
+
+    def post(self):
+        """Authenticates user with provided username and password, creating a session on success."""
+
+        data = request.get_json()
+        if not data or "username" not in data or "password" not in data:
+            return make_response(
+                jsonify({"error": "Username and password are required"}), 400
+            )
+
+        username = data["username"].lower()
+
+        # Shed floods before touching the database or running bcrypt.
+        retry_after = login_throttle.check(username, request.remote_addr)
+        if retry_after:
+            response = make_response(
+                jsonify({"error": "Too many login attempts, please try again later"}),
+                429,
+            )
+            response.headers["Retry-After"] = str(retry_after)
+            return response
+
+        user = UserAuth.query.filter_by(username=username).first()
+        try:
+            if user:
+                # Utilize the check_password method of the UserAuth model
+                authenticated = user.check_password(data["password"])
+            else:
+                authenticated = password_hasher.verify_unknown_user(data["password"])
+            if authenticated and password_hasher.needs_rehash(user.password_hash):
+                # The configured cost changed since this hash was made.
+                user.password = data["password"]
+        except PasswordHasherBusy:
+            return auth_busy_response()
+
+        if authenticated:
+            session["user_id"] = user.id
+            session["username"] = user.username
+            session["logged_in"] = True
+
+            # Create a new UserSession instance
+            new_user_session = UserSession(
+                user_id=user.id, started_at=datetime.utcnow()
+            )
+            db.session.add(new_user_session)
+            db.session.commit()
+            conversation_cache.invalidate(user.id)
+
+            session["session_id"] = new_user_session.id
+
+            response_data = {
+                "message": "Login successful",
+                "user_id": user.id,
+                "username": user.username,
+                "email": user.email,
+                "session_id": new_user_session.id,
+            }
+
+            return make_response(jsonify(response_data), 200)
+        else:
+            login_throttle.record_failure(username)
+            return make_response(
+                jsonify({"error": "Invalid username or password"}), 401
+            )
+
+
+class UserLogoutResource(Resource):
+    def post(self):
+        user_id = session.get("user_id")
+
+        if user_id:
+            current_session = (
+                UserSession.query.filter_by(user_id=user_id, ended_at=None)
+                .order_by(UserSession.started_at.desc())
+                .first()
+            )
+            if current_session:
+                current_session.ended_at = datetime.utcnow()
+                db.session.commit()
+            conversation_cache.invalidate(user_id)
+
+        session.clear()
+
+        response = make_response(jsonify({"message": "Logout successful"}), 200)
+        response.set_cookie("session", "", expires=0)
+        return response
+
+
+class SessionCheckResource(Resource):
+    def get(self):
+        user_id = session.get("user_id")
+        if user_id:
+            user = UserAuth.query.get(user_id)
+            if user:
+                return make_response(
+                    jsonify(
+                        {
+                            "authenticated": True,
+                            "id": user.id,
+                            "username": user.username,
+                            "email": user.email,
+                        }
+                    ),
+                    200,
+                )
+            else:
+                return make_response(
+                    jsonify({"authenticated": False, "message": "User not found"}),
+                    404,
+                )
+        else:
+            return make_response(jsonify({"authenticated": False}), 200)
+
+
+LLM_SECONDS = histogram(
+    "llm_request_duration_seconds",
+    "Time for the upstream model to return a full completion.",
+    ["model", "mode"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60),
+)
+LLM_TOKENS = counter(
+    "llm_tokens_total", "Tokens reported by the upstream model.", ["model", "kind"]
+)
+LLM_ERRORS = counter(
+    "llm_errors_total", "Upstream LLM calls that failed.", ["model", "error"]
+)
+
+
+def support_guide_prompt(user_message):
+    """
+    Returns the system prompt for `user_message`: the support guide's persona
+    and its GUIDE_TOP_K sections most relevant to the message, or the whole
+    guide when GUIDE_TOP_K is 0.
+    """
+    guide = prompt_assets.get("support_guide")
+    top_k = current_app.config["GUIDE_TOP_K"]
+    return guide.prompt(user_message, top_k) if top_k else guide.text
+
+
+# Turns beyond the verbatim window loaded per request, so a long backlog of
+# unsummarised turns is folded over several requests rather than all at once.
+CONTEXT_FOLD_BATCH = 20
+
+
+def recent_turns_query(session_id, summary_through_id, limit):
+    """The newest `limit` turns of a session not yet folded into its summary."""
+    return (
+        db.select(ChatMessage)
+        .filter(
+            ChatMessage.session_id == session_id,
+            ChatMessage.id > (summary_through_id or 0),
+        )
+        .order_by(ChatMessage.id.desc())
+        .limit(limit)
+    )
+
+
+def backlog_turns_query(session_id, summary_through_id, before_id, limit):
+    """The oldest `limit` unfolded turns of a session older than `before_id`."""
+    return (
+        db.select(ChatMessage)
+        .filter(
+            ChatMessage.session_id == session_id,
+            ChatMessage.id > (summary_through_id or 0),
+            ChatMessage.id < before_id,
+        )
+        .order_by(ChatMessage.id)
+        .limit(limit)
+    )
+
+
+def latest_turns_query(user_id, limit):
+    """The user's newest `limit` turns across sessions."""
+    return (
+        db.select(ChatMessage)
+        .filter_by(user_id=user_id)
+        .order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc())
+        .limit(limit)
+    )
+
+
+def load_conversation_tail(user_id):
+    """
+    Reads the user's open session, its rolling summary and the turns not yet
+    folded into it, including turns still waiting in the write-behind queue.
+    A longer backlog is loaded as its oldest CONTEXT_FOLD_BATCH turns plus the
+    newest CONTEXT_MAX_TURNS. Without an open session, the user's latest turns
+    are used.
+    """
+    with consistent_chat_reads():
+        session_id = current_session_id(user_id)
+        chat_session = db.session.get(UserSession, session_id) if session_id else None
+
+        gap_after_id = None
+        if chat_session:
+            recent = db.session.scalars(
+                recent_turns_query(
+                    chat_session.id,
+                    chat_session.summary_through_id,
+                    current_app.config["CONTEXT_MAX_TURNS"],
+                )
+            ).all()
+            # The oldest unfolded turns, so the summary is extended from where it
+            # stopped; one more row than the batch tells whether any are left
+            # between the batch and the recent turns.
+            backlog = (
+                db.session.scalars(
+                    backlog_turns_query(
+                        chat_session.id,
+                        chat_session.summary_through_id,
+                        recent[-1].id,
+                        CONTEXT_FOLD_BATCH + 1,
+                    )
+                ).all()
+                if recent
+                else []
+            )
+            if len(backlog) > CONTEXT_FOLD_BATCH:
+                backlog = backlog[:CONTEXT_FOLD_BATCH]
+                gap_after_id = backlog[-1].id
+            turns = backlog + list(reversed(recent))
+        else:
+            recent = db.session.scalars(
+                latest_turns_query(user_id, current_app.config["CONTEXT_MAX_TURNS"])
+            ).all()
+            turns = list(reversed(recent))
+        turns += pending_chat_messages(
+            session_id=session_id, user_id=None if session_id else user_id
+        )
+
+    return ConversationTail(
+        session_id=session_id,
+        summary=chat_session.summary if chat_session else None,
+        summary_through_id=chat_session.summary_through_id if chat_session else None,
+        turns=tuple(Turn(msg.id, msg.message, msg.response) for msg in turns),
+        gap_after_id=gap_after_id,
+    )
+
+
+def conversation_tail(user_id):
+    """Returns the user's conversation tail from the cache, loading it on a miss."""
+    tail = conversation_cache.get(user_id)
+    if tail is None:
+        tail = load_conversation_tail(user_id)
+        conversation_cache.put(user_id, tail)
+    return tail
+
+
+def remember_turn(chat_message):
+    """
+    Writes a ChatMessage through to its user's cached tail, once committed or
+    queued for writing.
+    """
+    conversation_cache.append(
+        chat_message.user_id,
+        chat_message.session_id,
+        Turn(chat_message.id, chat_message.message, chat_message.response),
+    )
+
+
+def insert_chat_messages(app, chat_messages):
+    """
+    Inserts queued ChatMessage objects with one multi-row INSERT, and adds them to
+    the daily usage rollup in the same transaction. Runs on the write-behind
+    thread, outside any request, so it takes the `app` to connect with.
+
+    Returns:
+    list: The new ids, in the order of `chat_messages`.
+    """
+    table = ChatMessage.__table__
+    rows = [
+        {column.key: getattr(msg, column.key) for column in table.columns}
+        for msg in chat_messages
+    ]
+    for row in rows:
+        del row["id"]
+    with app.app_context(), db.engine.begin() as connection:
+        result = connection.execute(
+            table.insert().returning(table.c.id, sort_by_parameter_order=True), rows
+        )
+        ids = [row.id for row in result]
+        UserDailyUsage.increment(connection, chat_messages)
+        return ids
+
+
+def chat_messages_flushed(chat_messages, ids):
+    for chat_message, chat_message_id in zip(chat_messages, ids):
+        chat_message.id = chat_message_id
+        conversation_cache.resolve(
+            chat_message.user_id, chat_message.session_id, chat_message_id
+        )
+
+
+# With CHAT_WRITE_BEHIND, completed chat messages are queued and inserted in
+# batches by a background thread; otherwise each one is committed in its request.
+# Each process creates its own queue when it first needs one, so a preloading
+# master, scripts and benchmarks never start a flush thread.
+_chat_writer_lock = threading.Lock()
+
+
+def start_chat_writer(app):
+    """
+    Returns the write-behind queue of `app` in this process, creating and
+    starting it on first use, or None when CHAT_WRITE_BEHIND is off. The queue is
+    stopped, writing out what is still queued, when the process exits.
+    """
+    if not app.config["CHAT_WRITE_BEHIND"]:
+        return None
+    with _chat_writer_lock:
+        chat_writer = app.extensions.get("chat_writer")
+        if chat_writer is None:
+            chat_writer = WriteBehindQueue(
+                lambda chat_messages: insert_chat_messages(app, chat_messages),
+                max_batch=app.config["CHAT_WRITE_BEHIND_BATCH"],
+                flush_interval=app.config["CHAT_WRITE_BEHIND_INTERVAL"],
+                max_pending=app.config["CHAT_WRITE_BEHIND_MAX_PENDING"],
+                on_queued=remember_turn,
+                on_flushed=chat_messages_flushed,
+            )
+            chat_writer.start()
+            app.extensions["chat_writer"] = chat_writer
+            gauge(
+                "chat_writer_pending",
+                "Chat messages waiting in the write-behind queue.",
+            ).set_function(lambda: chat_writer.stats()["pending"])
+            atexit.register(chat_writer.stop)
+    return chat_writer
+
+
+def running_chat_writer():
+    """The current app's write-behind queue, if this process has started it."""
+    return current_app.extensions.get("chat_writer")
+
+
+def save_chat_message(chat_message):
+    """
+    Persists a completed ChatMessage and adds it to the user's daily usage,
+    through the write-behind queue when it is enabled. Queued messages have no id
+    until they are flushed.
+
+    Raises:
+    WriteBehindFull: If the queue is full and the database cannot keep up.
+    """
+    if chat_message.timestamp is None:
+        chat_message.timestamp = datetime.utcnow()
+
+    chat_writer = start_chat_writer(current_app)
+    if chat_writer is None:
+        db.session.add(chat_message)
+        UserDailyUsage.increment(db.session, [chat_message])
+        db.session.commit()
+        remember_turn(chat_message)
+        return
+
+    chat_writer.submit(chat_message)
+
+
+def pending_chat_messages(session_id=None, user_id=None):
+    """Returns the queued ChatMessages of a session or user, oldest first."""
+    chat_writer = running_chat_writer()
+    if chat_writer is None:
+        return []
+    if session_id is not None:
+        return chat_writer.pending(lambda msg: msg.session_id == session_id)
+    return chat_writer.pending(lambda msg: msg.user_id == user_id)
+
+
+@contextmanager
+def consistent_chat_reads():
+    """
+    Keeps the write-behind queue from flushing while the caller reads chat
+    messages from both the database and the queue, so none is seen twice or missed.
+    """
+    chat_writer = running_chat_writer()
+    if chat_writer is None:
+        yield
+        return
+    with chat_writer.consistent():
+        yield
+
+
+def build_messages(user_id, user_message, tail, model="gpt-3.5-turbo"):
+    """
+    Builds the prompt: the parts of the support guide relevant to the message,
+    the session's rolling summary, the latest turns that fit in
+    CONTEXT_TOKEN_BUDGET tokens, then the new message.
+
+    Turns that no longer fit are folded into the session's summary and the
+    session remembers the newest folded turn, so each turn is summarised once and
+    the prompt stays bounded however long the conversation runs. A backlog
+    larger than CONTEXT_FOLD_BATCH is folded oldest first over several requests.
+    The fold is a single UPDATE, so building from a cached tail reads nothing
+    from the database.
+    """
+    turns, overflow = pack_turns(
+        list(reversed(tail.turns)),
+        current_app.config["CONTEXT_TOKEN_BUDGET"],
+        current_app.config["CONTEXT_MAX_TURNS"],
+        model,
+    )
+
+    # Turns still in the write-behind queue have no id to record as folded, so
+    # they stay verbatim until they are written. Only turns contiguous with the
+    # summary are folded; unloaded backlog turns would otherwise fall below the
+    # new watermark without ever being summarised.
+    queued = [turn for turn in overflow if turn.id is None]
+    if queued:
+        overflow = [turn for turn in overflow if turn.id is not None]
+        turns = queued + turns
+    if tail.gap_after_id is not None:
+        overflow = [turn for turn in overflow if turn.id <= tail.gap_after_id]
+
+    summary = tail.summary
+    if tail.session_id and overflow:
+        summary = fold_summary(
+            summary, overflow, current_app.config["CONTEXT_SUMMARY_TOKENS"], model
+        )
+        summary_through_id = max(turn.id for turn in overflow)
+        UserSession.query.filter_by(id=tail.session_id).update(
+            {"summary": summary, "summary_through_id": summary_through_id}
+        )
+        db.session.commit()
+        conversation_cache.fold(user_id, tail.session_id, summary, summary_through_id)
+
+    return (
+        [{"role": "system", "content": support_guide_prompt(user_message)}]
+        + context_messages(summary if tail.session_id else None, turns)
+        + [{"role": "user", "content": user_message}]
+    )
+
+
+def get_completion(
+    user_id,
+    user_message,
+    tail,
+    model="gpt-3.5-turbo",
+    temperature=0.7,
+    max_tokens=150,
+    use_cache=True,
+):
+    """
+    Returns the Completion for `user_message`, or None if the provider failed.
+    A cached answer comes back with zero token usage and latency.
+
+    Raises:
+    LLMGatewayBusy: If every upstream slot stays busy.
+    """
+    messages = build_messages(user_id, user_message, tail, model)
+    cache_key = completion_cache.make_key(model, temperature, max_tokens, messages)
+
+    if use_cache:
+        cached = completion_cache.get(cache_key)
+        g.completion_cache = "HIT" if cached else "MISS"
+        if cached:
+            return Completion(cached, model, 0, 0, 0.0)
+
+    try:
+        completion = llm_gateway.complete(
+            messages, model=model, temperature=temperature, max_tokens=max_tokens
+        )
+        LLM_SECONDS.labels(model, "complete").observe(completion.latency)
+        if completion.prompt_tokens is not None:
+            LLM_TOKENS.labels(model, "prompt").inc(completion.prompt_tokens)
+        if completion.completion_tokens is not None:
+            LLM_TOKENS.labels(model, "completion").inc(completion.completion_tokens)
+        if use_cache:
+            completion_cache.set(cache_key, completion.text)
+        return completion
+    except LLMGatewayBusy:
+        LLM_ERRORS.labels(model, "busy").inc()
+        raise
+    except LLMGatewayError as e:
+        LLM_ERRORS.labels(model, type(e).__name__).inc()
+        print(f"Error: {e}")
+    return None
+
+
+def stream_completion(
+    user_id,
+    user_message,
+    tail,
+    model="gpt-3.5-turbo",
+    temperature=0.7,
+    max_tokens=150,
+    use_cache=True,
+):
+    """
+    Yields the completion for `user_message` as text fragments, as soon as the
+    provider produces them. A cached completion is yielded as a single fragment.
+
+    Once the stream ends or is closed, `g.completion` holds a Completion for the
+    text produced so far. Streams carry no usage, so its token counts come from
+    the local tokenizer.
+    """
+    messages = build_messages(user_id, user_message, tail, model)
+    cache_key = completion_cache.make_key(model, temperature, max_tokens, messages)
+
+    if use_cache:
+        cached = completion_cache.get(cache_key)
+        if cached:
+            g.completion = Completion(cached, model, 0, 0, 0.0)
+            yield cached
+            return
+
+    parts = []
+    started = time.perf_counter()
+    try:
+        for delta in llm_gateway.stream(
+            messages, model=model, temperature=temperature, max_tokens=max_tokens
+        ):
+            parts.append(delta)
+            yield delta
+    except LLMGatewayBusy:
+        LLM_ERRORS.labels(model, "busy").inc()
+        raise
+    except LLMGatewayError as e:
+        LLM_ERRORS.labels(model, type(e).__name__).inc()
+        raise
+    finally:
+        text = "".join(parts).strip()
+        g.completion = Completion(
+            text,
+            model,
+            count_message_tokens(messages, model),
+            count_tokens(text, model),
+            time.perf_counter() - started,
+        )
+    LLM_SECONDS.labels(model, "stream").observe(g.completion.latency)
+    LLM_TOKENS.labels(model, "prompt").inc(g.completion.prompt_tokens)
+    LLM_TOKENS.labels(model, "completion").inc(g.completion.completion_tokens)
+
+    if use_cache:
+        completion_cache.set(cache_key, text)
+
+
+def wants_cached_completion(data):
+    """
+    A request bypasses the completion cache with `Cache-Control: no-cache` or a
+    `"cache": false` field in its body.
+    """
+    if "no-cache" in request.headers.get("Cache-Control", ""):
+        return False
+    return data.get("cache", True) is not False
+
+
+def busy_response(message):
+    response = jsonify({"error": message})
+    response.status_code = 503
+    response.headers["Retry-After"] = "1"
+    return response
+
+
+def ai_busy_response():
+    return busy_response("The assistant is busy, please try again shortly.")
+
+
+def auth_busy_response():
+    return busy_response("Too many sign-in requests, please try again shortly.")
+
+
+def admin_error_response():
+    """
+    Returns the error response for a request not made by an administrator, or
+    None when the session belongs to a user named in ADMIN_USERNAMES.
+    """
+    if not session.get("user_id"):
+        return make_response(jsonify({"error": "User not logged in."}), 401)
+    if session.get("username") not in current_app.config["ADMIN_USERNAMES"]:
+        return make_response(jsonify({"error": "Administrator access required."}), 403)
+    return None
+
+
+def current_session_id(user_id):
+    current_session = (
+        UserSession.query.filter_by(user_id=user_id, ended_at=None)
+        .order_by(UserSession.started_at.desc())
+        .first()
+    )
+    return current_session.id if current_session else None
+
+
+def sse_event(data, event=None):
+    """Formats `data` as a single Server-Sent Events frame."""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {compact_dumps(data)}\n\n"
+
+
+def wants_ndjson():
+    if request.args.get("format") == "ndjson":
+        return True
+    best = request.accept_mimetypes.best_match(
+        ["application/json", "application/x-ndjson"]
+    )
+    return best == "application/x-ndjson"
+
+
+def wants_event_stream():
+    best = request.accept_mimetypes.best_match(
+        ["application/json", "text/event-stream"]
+    )
+    return best == "text/event-stream"
+
+
+def not_modified_response(etag):
+    """
+    Returns a 304 Not Modified response if the request's If-None-Match lists
+    `etag`, in any content coding, or None when the full response is needed.
+    """
+    for tag in request.if_none_match.as_set():
+        if strip_encoding(tag) == etag:
+            return revalidated_response(make_response("", 304), tag)
+    return None
+
+
+def revalidated_response(response, etag):
+    """
+    Tags a per-user response with a strong ETag. Clients may keep it but must
+    revalidate it on every use, which costs a 304 while it is unchanged.
+    """
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+@views.route("/api/chat_messages", methods=["POST"])
+def chat():
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "You must be signed in to send messages."}), 403
+
+    data = request.json
+    user_message = data.get("message")
+    if not user_message:
+        return jsonify({"error": "No message provided."}), 400
+
+    use_cache = wants_cached_completion(data)
+    tail = conversation_tail(user_id)
+
+    if wants_event_stream():
+        return stream_chat_response(user_id, tail, user_message, use_cache)
+
+    try:
+        completion = get_completion(user_id, user_message, tail, use_cache=use_cache)
+    except LLMGatewayBusy:
+        return ai_busy_response()
+
+    if completion and completion.text:
+        new_chat_message = completed_chat_message(
+            user_id, tail.session_id, user_message, completion
+        )
+        try:
+            save_chat_message(new_chat_message)
+        except WriteBehindFull:
+            return busy_response(
+                "Too many messages are waiting to be saved, please try again shortly."
+            )
+
+        response = jsonify(serialize_chat_message(new_chat_message))
+        response.headers["X-Cache"] = g.get("completion_cache", "BYPASS")
+        return response, 200
+    else:
+        return jsonify({"error": "Failed to get response from AI"}), 500
+
+
+@views.route("/api/chat_messages/stream", methods=["POST"])
+def chat_stream():
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "You must be signed in to send messages."}), 403
+
+    data = request.json
+    user_message = data.get("message")
+    if not user_message:
+        return jsonify({"error": "No message provided."}), 400
+
+    return stream_chat_response(
+        user_id,
+        conversation_tail(user_id),
+        user_message,
+        wants_cached_completion(data),
+    )
+
+
+def completed_chat_message(user_id, session_id, user_message, completion):
+    """Builds the ChatMessage for a completion, with its usage and latency."""
+    return ChatMessage(
+        user_id=user_id,
+        session_id=session_id,
+        message=user_message,
+        response=completion.text,
+        model=completion.model,
+        prompt_tokens=completion.prompt_tokens,
+        completion_tokens=completion.completion_tokens,
+        latency_ms=round(completion.latency * 1000),
+    )
+
+
+def stream_chat_response(user_id, tail, user_message, use_cache=True):
+    """
+    Streams the AI response as Server-Sent Events.
+
+    Each text fragment is sent as a `delta` event as soon as it arrives. Once the
+    stream finishes, the client disconnects, or the provider fails part-way, the
+    text received so far is persisted as a single ChatMessage. Provider failures are
+    reported with an `error` event, and a final `done` event carries the stored message.
+    """
+
+    def generate():
+        stream = stream_completion(user_id, user_message, tail, use_cache=use_cache)
+        try:
+            for delta in stream:
+                yield sse_event({"delta": delta}, event="delta")
+        except LLMGatewayBusy:
+            yield sse_event(
+                {"error": "The assistant is busy, please try again shortly."},
+                event="error",
+            )
+        except Exception as e:
+            print(f"Error: {e}")
+            yield sse_event({"error": "Failed to get response from AI"}, event="error")
+        finally:
+            # Closing the stream records the usage of whatever it produced.
+            stream.close()
+            completion = g.get("completion")
+            new_chat_message = None
+            if completion and completion.text:
+                new_chat_message = completed_chat_message(
+                    user_id, tail.session_id, user_message, completion
+                )
+                try:
+                    save_chat_message(new_chat_message)
+                except WriteBehindFull as e:
+                    print(f"Error: {e}")
+                    new_chat_message = None
+
+        if new_chat_message is not None:
+            yield sse_event(serialize_chat_message(new_chat_message), event="done")
+
+    response = Response(stream_with_context(generate()), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@views.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+USAGE_DAYS = 30
+USAGE_MAX_DAYS = 366
+
+
+@views.route("/api/usage", methods=["GET"])
+def usage():
+    """
+    Returns the signed-in user's daily usage for the last `days` days (default 30),
+    newest first, read straight from the rollup table.
+    """
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "User not logged in."}), 401
+
+    try:
+        days = parse_limit(request.args.get("days"), USAGE_DAYS, USAGE_MAX_DAYS)
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    rows = (
+        UserDailyUsage.query.filter(
+            UserDailyUsage.user_id == user_id, UserDailyUsage.day >= since
+        )
+        .order_by(UserDailyUsage.day.desc())
+        .all()
+    )
+    return (
+        jsonify(
+            {
+                "days": [
+                    {
+                        "day": row.day.isoformat(),
+                        "message_count": row.message_count,
+                        "prompt_tokens": row.prompt_tokens,
+                        "completion_tokens": row.completion_tokens,
+                        "latency_ms": row.latency_ms,
+                    }
+                    for row in rows
+                ]
+            }
+        ),
+        200,
+    )
+
+
+@views.route("/api/cache_stats", methods=["GET"])
+def cache_stats():
+    error = admin_error_response()
+    if error:
+        return error
+
+    chat_writer = running_chat_writer()
+    return (
+        jsonify(
+            {
+                "completions": completion_cache.stats(),
+                "conversations": conversation_cache.stats(),
+                "prompt_assets": prompt_assets.stats(),
+                "chat_writer": chat_writer.stats() if chat_writer else None,
+            }
+        ),
+        200,
+    )
+
+
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+
+def last_chat_message_key(user_id=None, session_id=None):
+    """
+    Returns (session_id, id, timestamp) of the newest message of a user, or of one
+    session, or None when there is none. A message still waiting in the
+    write-behind queue has no id yet and is returned with an id of None.
+
+    Messages are never edited, so the key identifies the state of a session's
+    history and is enough to derive its ETag without loading the messages.
+    """
+    pending = pending_chat_messages(session_id=session_id, user_id=user_id)
+    if pending:
+        newest = pending[-1]
+        return newest.session_id, None, newest.timestamp
+
+    query = db.session.query(
+        ChatMessage.session_id, ChatMessage.id, ChatMessage.timestamp
+    )
+    if session_id is not None:
+        query = query.filter(ChatMessage.session_id == session_id)
+    else:
+        query = query.filter(ChatMessage.user_id == user_id)
+    newest = query.order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc()).first()
+    return tuple(newest) if newest else None
+
+
+def chat_history_page(session_id, limit=HISTORY_PAGE_SIZE, before=None):
+    """
+    Returns one page of a session's messages, newest page first, using keyset
+    pagination on (timestamp, id) so deep pages cost the same as the first one.
+
+    Callers must check that the session belongs to the requesting user. The first
+    page also includes messages still waiting in the write-behind queue, so a
+    client always reads its own writes.
+
+    Args:
+    session_id (int): The session to read.
+    limit (int): Maximum number of ChatMessage rows on the page.
+    before (tuple): Optional (timestamp, id) position; only older rows are returned.
+
+    Returns:
+    tuple: The page's ChatMessage rows in chronological order, and the cursor for
+    the next (older) page, or None when there are no older rows.
+    """
+    with consistent_chat_reads():
+        pending = [] if before else pending_chat_messages(session_id=session_id)
+        db_limit = max(limit - len(pending), 1)
+
+        query = ChatMessage.query.filter_by(session_id=session_id)
+        if before:
+            before_timestamp, before_id = before
+            query = query.filter(
+                ChatMessage.timestamp <= before_timestamp,
+                or_(
+                    ChatMessage.timestamp < before_timestamp,
+                    ChatMessage.id < before_id,
+                ),
+            )
+
+        rows = (
+            query.order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc())
+            .limit(db_limit + 1)
+            .all()
+        )
+    next_cursor = None
+    if len(rows) > db_limit:
+        rows = rows[:db_limit]
+        next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id)
+
+    return list(reversed(rows)) + pending, next_cursor
+
+
+@views.route("/api/chat_history", methods=["GET"])
+def chat_history():
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "User not logged in."}), 401
+
+    try:
+        limit = parse_limit(
+            request.args.get("limit"), HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE
+        )
+        before = request.args.get("before")
+        before = decode_cursor(before) if before else None
+        session_id = request.args.get("session_id")
+        if session_id is not None:
+            session_id = validate_type(session_id, "session_id", int)
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+
+    if session_id is None:
+        newest = last_chat_message_key(user_id=user_id)
+        session_id = newest[0] if newest else None
+    else:
+        newest = None
+
+    chat_session = UserSession.query.get(session_id) if session_id else None
+    if not chat_session or chat_session.user_id != user_id:
+        return jsonify({"error": "No previous session found."}), 404
+
+    if newest is None:
+        newest = last_chat_message_key(session_id=session_id)
+    etag = make_etag(request.endpoint, user_id, session_id, limit, before, newest)
+    not_modified = not_modified_response(etag)
+    if not_modified:
+        return not_modified
+
+    chat_messages, next_cursor = chat_history_page(session_id, limit, before)
+
+    return revalidated_response(
+        jsonify(
+            {
+                "session_id": session_id,
+                "messages": history_messages(chat_messages),
+                "next_cursor": next_cursor,
+            }
+        ),
+        etag,
+    )
+
+
+@views.route("/api/continue_last_conversation", methods=["GET"])
+def continue_last_conversation():
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "User not logged in."}), 401
+
+    newest = last_chat_message_key(user_id=user_id)
+
+    if not newest:
+        return jsonify({"error": "No previous session found."}), 404
+
+    # The newest message identifies the whole response, so a client that
+    # already holds it gets a 304 before the session or its history is loaded.
+    last_session_id = newest[0]
+    etag = make_etag(request.endpoint, user_id, newest)
+    not_modified = not_modified_response(etag)
+    if not_modified:
+        return not_modified
+
+    last_session = UserSession.query.get(last_session_id)
+
+    if not last_session:
+        return jsonify({"error": "No previous session found."}), 404
+
+    # Only the newest page is returned; older messages are fetched lazily from
+    # /api/chat_history with the returned cursor.
+    chat_messages, next_cursor = chat_history_page(last_session_id)
+
+    if not chat_messages:
+        return jsonify({"message": "No messages found in the last session."}), 200
+
+    return revalidated_response(
+        jsonify(
+            {
+                "session_id": last_session.id,
+                "messages": history_messages(chat_messages),
+                "next_cursor": next_cursor,
+            }
+        ),
+        etag,
+    )
+
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+
+@views.route("/api/chat_messages/search", methods=["GET"])
+def search_chat_history():
+    """
+    Searches the user's messages and responses for the words in `q`, best match
+    first, `limit` results at a time starting at `offset`. Each result names its
+    session and carries snippets with the matched words in <mark> tags.
+    """
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "User not logged in."}), 401
+
+    try:
+        query = validate_not_blank(request.args.get("q"), "query")
+        limit = parse_limit(
+            request.args.get("limit"), SEARCH_PAGE_SIZE, SEARCH_MAX_PAGE_SIZE
+        )
+        offset = validate_positive_number(
+            validate_type(request.args.get("offset", 0), "offset", int), "offset"
+        )
+        terms = search_terms(query)
+        if not terms:
+            raise ValueError("The query must contain a word to search for.")
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+
+    results, next_offset = search_chat_messages(
+        db.session, user_id, terms, limit, offset
+    )
+    return (
+        jsonify(
+            {
+                "results": [serialize_search_result(result) for result in results],
+                "next_offset": next_offset,
+            }
+        ),
+        200,
+    )
+
+
+api.add_resource(UserLoginResource, "/api/login")
+api.add_resource(UserLogoutResource, "/api/logout")
+api.add_resource(UserAuthResource, "/api/user_auth")
+api.add_resource(SessionCheckResource, "/api/check_session")
+
+
+def init_views(app):
+    """Registers the API views on `app` and starts the state they share per process."""
+    prompt_assets.check_interval = app.config["PROMPT_ASSET_CHECK_INTERVAL"]
+    prompt_assets.register("support_guide", file_path, parse=GuideIndex)
+    install_reload_signal(prompt_assets)
+    app.register_blueprint(views)
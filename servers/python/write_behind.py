@@ -0,0 +1,232 @@
+# Write-behind queue that persists records in batches from a background thread.
+
+import signal
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+class WriteBehindFull(Exception):
+    """Raised when the queue is full and flushing it inline failed too."""
+
+
+class WriteBehindQueue:
+    """
+    Buffers records and inserts them in batches, off the request path.
+
+    A background thread flushes whenever `max_batch` records are waiting or
+    `flush_interval` seconds have passed. When `max_pending` records are already
+    waiting, `submit` flushes inline in the caller's thread before queueing, so a
+    slow database pushes back on the requests producing the writes instead of
+    growing the buffer.
+
+    Flushes hold the queue's lock from insert to removal, and `on_queued` /
+    `on_flushed` run under it, so readers using `consistent()` see every record
+    exactly once: either still pending or already in the database.
+
+    A queue belongs to the process that created it: its flush thread does not
+    survive a fork, so a forked process must create its own queue.
+
+    Args:
+    insert_batch (callable): Inserts a list of records and returns their new ids, in order.
+    max_batch (int): Records inserted per statement.
+    flush_interval (float): Longest time, in seconds, a record waits before being flushed.
+    max_pending (int): Records buffered before submitters have to flush themselves.
+    on_queued (callable): Called with each record once it is queued.
+    on_flushed (callable): Called with each flushed batch and its ids.
+    """
+
+    def __init__(
+        self,
+        insert_batch,
+        max_batch=200,
+        flush_interval=0.5,
+        max_pending=2000,
+        on_queued=None,
+        on_flushed=None,
+    ):
+        self.insert_batch = insert_batch
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.on_queued = on_queued
+        self.on_flushed = on_flushed
+        self._pending = []
+        self._lock = threading.RLock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stopping = False
+        self._thread = None
+        self.flushed = 0
+        self.batches = 0
+        self.inline_flushes = 0
+        self.failures = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="write-behind", daemon=True
+            )
+            self._thread.start()
+
+    def submit(self, record):
+        """
+        Queues `record` for insertion.
+
+        Once the queue is stopping nothing flushes in the background any more, so
+        the queue is drained and `record` inserted inline instead.
+
+        Raises:
+        WriteBehindFull: If the queue is full, or stopping, and could not be flushed.
+        """
+        with self._lock:
+            if self._stopping:
+                self._insert_inline(record)
+                return
+            if len(self._pending) >= self.max_pending:
+                self.inline_flushes += 1
+                self.flush()
+                if len(self._pending) >= self.max_pending:
+                    raise WriteBehindFull(f"{len(self._pending)} records pending")
+            self._pending.append(record)
+            if self.on_queued:
+                self.on_queued(record)
+            if len(self._pending) >= self.max_batch:
+                self._wakeup.notify()
+
+    def pending(self, predicate=None):
+        """Returns the queued records, oldest first, optionally filtered."""
+        with self._lock:
+            return [r for r in self._pending if predicate is None or predicate(r)]
+
+    @contextmanager
+    def consistent(self):
+        """Holds off flushes while the caller reads both the database and `pending()`."""
+        with self._lock:
+            yield
+
+    def flush(self):
+        """
+        Inserts up to `max_batch` of the oldest queued records. On failure the
+        records stay queued and are retried on the next flush.
+
+        Returns:
+        int: The number of records inserted.
+        """
+        with self._lock:
+            batch = self._pending[: self.max_batch]
+            if not batch:
+                return 0
+            try:
+                ids = self.insert_batch(batch)
+            except Exception as e:
+                self.failures += 1
+                print(f"Write-behind flush error: {e}")
+                return 0
+            del self._pending[: len(batch)]
+            self.flushed += len(batch)
+            self.batches += 1
+            if self.on_flushed:
+                self.on_flushed(batch, ids)
+            return len(batch)
+
+    def drain(self):
+        """Flushes until the queue is empty or a flush fails."""
+        while self.flush():
+            pass
+
+    def stop(self, timeout=10.0):
+        """Stops the background thread and flushes everything still queued."""
+        with self._lock:
+            self._stopping = True
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.drain()
+
+    def request_stop(self):
+        """
+        Marks the queue as stopping without flushing, so it is safe to call from a
+        signal handler; `stop()` still has to be called to write what is queued.
+        """
+        self._stopping = True
+        # The handler may have interrupted a thread holding the lock, possibly
+        # this one; the background thread then notices within flush_interval.
+        if self._lock.acquire(blocking=False):
+            try:
+                self._wakeup.notify()
+            finally:
+                self._lock.release()
+
+    def stats(self):
+        return {
+            "pending": len(self._pending),
+            "max_pending": self.max_pending,
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "inline_flushes": self.inline_flushes,
+            "failures": self.failures,
+        }
+
+    def _insert_inline(self, record):
+        self.drain()
+        if self._pending:
+            raise WriteBehindFull(f"{len(self._pending)} records pending on stop")
+        try:
+            ids = self.insert_batch([record])
+        except Exception as e:
+            self.failures += 1
+            raise WriteBehindFull(f"Inline insert failed: {e}") from e
+        self.flushed += 1
+        self.batches += 1
+        if self.on_queued:
+            self.on_queued(record)
+        if self.on_flushed:
+            self.on_flushed([record], ids)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._pending) < self.max_batch and not self._stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wakeup.wait(remaining)
+                if self._stopping:
+                    return
+            while self.flush() == self.max_batch:
+                pass
+
+
+def install_flush_signal(queue, signum=signal.SIGTERM):
+    """
+    Stops `queue` when the process receives `signum` (SIGTERM by default), then
+    hands the signal to the previous handler, or exits if there was none.
+
+    The handler only marks the queue as stopping: it may have interrupted a
+    flush in progress, so the queued records are written by `queue.stop()` once
+    the interrupted code has unwound, from the previous handler's shutdown path
+    or the atexit hook run when the handler exits.
+
+    Signal handlers can only be installed from the main thread; elsewhere this is
+    a no-op and the caller should stop the queue from its own shutdown hook.
+
+    Returns:
+    bool: True if the handler was installed.
+    """
+
+    def handler(signum, frame):
+        queue.request_stop()
+        if previous is signal.SIG_IGN:
+            return
+        if callable(previous):
+            previous(signum, frame)
+        else:
+            sys.exit(128 + signum)
+
+    try:
+        previous = signal.signal(signum, handler)
+    except ValueError:
+        return False
+    return True